@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the Fast Odds API
+
+Runs everything against mock_upstream.py, never the live proxy, and reports:
+parse throughput per adapter, memory per stored runner, update_odds() cycle
+time, and requests per second / p99 latency per endpoint under concurrent
+load. Use --json to keep results for comparing builds.
+
+    python benchmark.py --scale 10 --concurrency 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import httpx
+import bookmakers
+import mock_upstream
+from bookmakers import ADAPTERS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ENDPOINTS = [
+    ("/odds", {}),
+    ("/odds", {"accept-encoding": "br"}),
+    ("/bet365", {}),
+    ("/horse/horse 1-1", {}),
+    ("/races", {}),
+    ("/markets", {"accept-encoding": "gzip"}),
+]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+def summarize(seconds: list) -> dict:
+    return {
+        "count": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 2),
+        "max_ms": round(max(seconds, default=0) * 1000, 2)
+    }
+
+def bench_parse(payloads: dict, iterations: int) -> dict:
+    """Typed decode and adapter parse throughput per bookmaker"""
+    results = {}
+    for name, variants in payloads.items():
+        adapter = ADAPTERS[name]
+        decode = parse = 0.0
+        runners = 0
+        for iteration in range(iterations):
+            body = variants[iteration % len(variants)]
+            started = time.perf_counter()
+            data = adapter.decode(body)
+            decoded = time.perf_counter()
+            feed = adapter.parse(data, time.time())
+            parse += time.perf_counter() - decoded
+            decode += decoded - started
+            runners += len(feed.runners)
+        results[name] = {
+            "runners": runners // iterations,
+            "payload_kb": round(len(variants[0]) / 1024, 1),
+            "decode_ms": round(decode / iterations * 1000, 2),
+            "parse_ms": round(parse / iterations * 1000, 2),
+            "runners_per_second": round(runners / parse) if parse else 0
+        }
+    return results
+
+def bench_memory(payloads: dict) -> dict:
+    """Bytes allocated per runner by the odds stores and horse index"""
+    from odds_store import HorseIndex, OddsStore
+
+    feeds = {name: ADAPTERS[name].parse(ADAPTERS[name].decode(variants[0]), time.time()) for name, variants in payloads.items()}
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    stores = {name: OddsStore(name) for name in feeds}
+    for name, feed in feeds.items():
+        stores[name].update(feed.runners, 1, time.time())
+    index = HorseIndex()
+    index.rebuild(horse_id for store in stores.values() for horse_id in store.horse_rows)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    runners = sum(len(store) for store in stores.values())
+    return {"runners": runners, "bytes": allocated, "bytes_per_runner": round(allocated / runners, 1) if runners else 0.0}
+
+async def bench_cycles(cycles: int) -> dict:
+    """update_odds() wall time over full cycles against the mock"""
+    import main
+
+    timings = []
+    try:
+        for _ in range(cycles):
+            started = time.perf_counter()
+            await main.update_odds()
+            timings.append(time.perf_counter() - started)
+    finally:
+        if main.warm_start_save is not None:
+            await main.warm_start_save
+        await main.close_http_clients()
+        main.price_history.close()
+        if main.parse_executor is not None:
+            main.parse_executor.shutdown()
+    handoff = main.parse_handoff_seconds.series.values()
+    handoff_ms = sum(series[1] for series in handoff) / max(sum(sum(series[0]) for series in handoff), 1) * 1000
+    return {
+        **summarize(timings),
+        "runners": sum(len(store) for store in main.odds_stores.values()),
+        "parse_pool": main.PARSE_EXECUTOR,
+        "handoff_ms_per_payload": round(handoff_ms, 2)
+    }
+
+async def bench_endpoints(base_url: str, concurrency: int, duration: float) -> dict:
+    """Requests per second and latency per endpoint with `concurrency` clients"""
+    results = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        for path, headers in ENDPOINTS:
+            timings, errors = [], 0
+            deadline = time.perf_counter() + duration
+
+            async def worker():
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.get(path, headers=headers)
+                        await response.aread()
+                        if response.status_code != 200:
+                            errors += 1
+                    except httpx.HTTPError:
+                        errors += 1
+                    timings.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            label = path + (f" ({headers['accept-encoding']})" if headers else "")
+            results[label] = {**summarize(timings), "rps": round(len(timings) / elapsed, 1), "errors": errors}
+    return results
+
+def start_process(args: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=HERE, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+async def wait_until_up(url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(timeout=2) as client:
+        while time.time() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+def print_table(title: str, rows: dict):
+    print(f"\n📊 {title}")
+    for name, values in rows.items():
+        print(f"   {name:<24} " + "  ".join(f"{key}={value}" for key, value in values.items()))
+
+async def run(args) -> dict:
+    mock_port, api_port = free_port(), free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock_args = [
+        "mock_upstream.py", "--port", str(mock_port), "--scale", str(args.scale),
+        "--latency", str(args.latency), "--error-rate", str(args.error_rate)
+    ]
+    if args.recorded:
+        mock_args += ["--recorded", args.recorded]
+
+    payloads = mock_upstream.build_payloads(args.scale, recorded=args.recorded)
+    results = {"scale": args.scale, "parse": bench_parse(payloads, args.parse_iterations), "memory": bench_memory(payloads)}
+    print_table("Parse (per payload)", results["parse"])
+    print_table("Memory", {"stores + index": results["memory"]})
+
+    history_dir = tempfile.mkdtemp(prefix="fast_odds_bench_")
+    env = {"UPSTREAM_BASE_URL": mock_url, "HISTORY_DIR": history_dir, "ODDS_ROLE": "standalone",
+           "DB_SINK_URL": "",  # never write benchmark odds to a configured database
+           "WARM_START_PATH": os.path.join(history_dir, "odds_snapshot.bin")}
+    os.environ.update(env)
+    bookmakers.UPSTREAM_BASE_URL = mock_url  # already imported, so point the adapters at the mock directly
+    mock = start_process(mock_args, {})
+    api = None
+    try:
+        await wait_until_up(mock_url + "/docs")
+        results["cycles"] = await bench_cycles(args.cycles)
+        print_table("update_odds() cycle", {"cycle": results["cycles"]})
+
+        if args.duration > 0:
+            api = start_process(["-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"], env)
+            await wait_until_up(f"http://127.0.0.1:{api_port}/")
+            results["endpoints"] = await bench_endpoints(f"http://127.0.0.1:{api_port}", args.concurrency, args.duration)
+            print_table(f"Endpoints ({args.concurrency} concurrent clients, {args.duration:.0f}s each)", results["endpoints"])
+    finally:
+        for process in (api, mock):
+            if process is not None:
+                process.terminate()
+                process.wait()
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Fast Odds API against the mock upstream")
+    parser.add_argument("--scale", type=int, default=1, help="mock payload scale (races cloned this many times)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock upstream latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock upstream 503 rate")
+    parser.add_argument("--recorded", help="directory holding <bookmaker>_raw_*.json recordings")
+    parser.add_argument("--parse-iterations", type=int, default=20)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per endpoint, 0 to skip")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    # The adapters' >1000-runner dedup warning fires on every scaled payload
+    logging.getLogger("bookmakers").setLevel(logging.CRITICAL)
+    args = parse_args()
+    print(f"🏁 Benchmarking at {args.scale}x scale against the mock upstream...")
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📁 Results saved to {args.json}")
@@ -0,0 +1,267 @@
+"""
+Bookmaker adapters for the Fast Odds API
+
+Each adapter knows where a bookmaker's races feed lives and how to turn its
+JSON into (race, horse, decimal odds) runners. Register new bookmakers with
+register() and the poller picks them up automatically.
+"""
+
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import msgspec
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_BASE_URL = os.getenv("UPSTREAM_BASE_URL", "http://116.202.109.99")
+UPSTREAM_PROXY_SECRET = os.getenv("UPSTREAM_PROXY_SECRET", "84cc5f87-13fa-4333-b8ba-1b92674f41d7")
+UK_TZ = ZoneInfo("Europe/London")
+
+def parse_off_time(value, now: float):
+    """Unix time of a race off from epoch, ISO or UK "HH:MM" values"""
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return value / 1000 if value > 1e11 else float(value)
+        value = str(value).strip()
+        match = re.match(r"^(\d{1,2}):(\d{2})", value)
+        if match:
+            today = datetime.fromtimestamp(now, UK_TZ)
+            off = today.replace(hour=int(match.group(1)), minute=int(match.group(2)), second=0, microsecond=0)
+            return off.timestamp()
+        off = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if off.tzinfo is None:
+            off = off.replace(tzinfo=UK_TZ)
+        return off.timestamp()
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=4096)
+def price_to_decimal(price: str):
+    """Decimal odds for a fractional ("5/2") or decimal ("3.5") price, None when unparseable"""
+    try:
+        if "/" in price:
+            parts = price.split("/")
+            if len(parts) != 2:
+                return None
+            return float(parts[0]) / float(parts[1]) + 1
+        return float(price)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def to_decimal(odds):
+    return price_to_decimal(odds) if isinstance(odds, str) else float(odds)
+
+# Typed views of the upstream payloads: only the fields the adapters read are decoded
+class Bet365Horse(msgspec.Struct):
+    na: str | None = None
+    OD: str | float | None = None
+
+class Bet365Race(msgspec.Struct):
+    league: str | None = None
+    raceNum: int | str | None = None
+    time: str | float | None = None
+    horses: list[Bet365Horse | None] = []
+
+class Bet365Payload(msgspec.Struct):
+    races: list[Bet365Race] = []
+
+class EWPrice(msgspec.Struct):
+    decimal: str | float | None = None
+    fractional: str | float | None = None
+
+class WilliamHillHorse(msgspec.Struct):
+    name: str | None = None
+    active: bool | None = True
+    EW: EWPrice | None = None
+
+class WilliamHillRace(msgspec.Struct):
+    name: str | None = None
+    settled: bool | None = False
+    horses: list[WilliamHillHorse | None] = []
+
+class WilliamHillPayload(msgspec.Struct):
+    races: list[WilliamHillRace] = []
+
+class ParsedFeed:
+    """Runners and race off times parsed from one payload"""
+
+    def __init__(self):
+        self.runners = []
+        self.off_times = {}
+        self.tracks = {}
+        self.skipped = 0
+        self._keys = set()
+
+    def __getstate__(self):
+        # The dedup keys are only needed while parsing; leave them out when sent between processes
+        return {**self.__dict__, "_keys": set()}
+
+    def add(self, key: str, race: str, horse: str, odds: float):
+        """Add a runner unless its normalized key was already seen"""
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        self.runners.append((race, horse, odds))
+
+class BookmakerAdapter:
+    """Base adapter: URL, headers, timeout, parser and key normalizer for one bookmaker"""
+
+    name = ""
+    label = ""
+    path = ""
+    timeout = 10.0
+    payload_type = race_type = horse_type = None  # msgspec structs for typed decoding
+
+    @property
+    def url(self) -> str:
+        return UPSTREAM_BASE_URL + self.path
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "accept": "*/*",
+            "x-rapidapi-proxy-secret": UPSTREAM_PROXY_SECRET
+        }
+
+    def normalize_key(self, race: str, horse: str) -> str:
+        """Key used to keep 1 entry per horse per race"""
+        return f"{race}|{horse}"
+
+    def decode(self, content: bytes):
+        """Decode a payload, typed to the fields parse() reads when the adapter declares them"""
+        if self.payload_type is None:
+            return msgspec.json.decode(content)
+        try:
+            return msgspec.json.decode(content, type=self.payload_type)
+        except msgspec.ValidationError as e:
+            logger.warning(f"⚠️ {self.label}: payload off schema ({e}), decoding runner by runner")
+            return self.typed(msgspec.json.decode(content))
+
+    def typed(self, data):
+        """The payload struct for decoded JSON; runners that do not fit become None (skipped)"""
+        if self.payload_type is None or isinstance(data, self.payload_type):
+            return data
+        races = []
+        for race in data.get("races") or [] if isinstance(data, dict) else []:
+            if not isinstance(race, dict):
+                continue
+            horses = []
+            for horse in race.get("horses") or []:
+                try:
+                    horses.append(msgspec.convert(horse, self.horse_type))
+                except msgspec.ValidationError:
+                    horses.append(None)
+            try:
+                typed_race = msgspec.convert({**race, "horses": []}, self.race_type)
+            except msgspec.ValidationError:
+                continue
+            typed_race.horses = horses
+            races.append(typed_race)
+        return self.payload_type(races=races)
+
+    def parse(self, data, now: float) -> ParsedFeed:
+        raise NotImplementedError
+
+class Bet365Adapter(BookmakerAdapter):
+    """Bet365 WIN odds - fractional "OD" prices, races labelled by league and number"""
+
+    name = "bet365"
+    label = "Bet365"
+    path = "/v2/bet365/sports/horse-racing/races"
+    payload_type, race_type, horse_type = Bet365Payload, Bet365Race, Bet365Horse
+
+    def parse(self, data, now: float) -> ParsedFeed:
+        feed = ParsedFeed()
+        races = self.typed(data).races
+
+        for race in races:
+            race_name = race.league if race.league is not None else "Unknown"
+            if race.raceNum:
+                race_name = f"Race {race.raceNum} - {race_name}"
+            feed.off_times[race_name] = parse_off_time(race.time, now)
+            feed.tracks[race_name] = race.league or ""
+
+            for horse in race.horses:
+                if horse is None:
+                    feed.skipped += 1
+                    continue
+                name, odds = horse.na, horse.OD
+                if name and odds and odds != "SP":
+                    decimal_odds = to_decimal(odds)
+                    if decimal_odds is None:
+                        feed.skipped += 1
+                        continue
+                    feed.add(self.normalize_key(race_name, name), race_name, name, decimal_odds)
+
+        if len(feed.runners) == 0:
+            logger.error(f"🚨 BET365 DEBUG: {len(races)} races found but 0 horses parsed!")
+            if races:
+                sample_horses = races[0].horses
+                logger.error(f"🚨 Sample race has {len(sample_horses)} horses")
+                if sample_horses:
+                    logger.error(f"🚨 Sample horse: {sample_horses[0]}")
+        return feed
+
+class WilliamHillAdapter(BookmakerAdapter):
+    """William Hill WIN odds - "EW" decimal prices, unsettled races only"""
+
+    name = "william_hill"
+    label = "William Hill"
+    path = "/willhill/horse-racing/races"
+    payload_type, race_type, horse_type = WilliamHillPayload, WilliamHillRace, WilliamHillHorse
+
+    def parse(self, data, now: float) -> ParsedFeed:
+        feed = ParsedFeed()
+        races = self.typed(data).races
+        active_races = [r for r in races if not r.settled]
+
+        for race in active_races:
+            race_name = race.name if race.name is not None else "Unknown"
+            feed.off_times[race_name] = parse_off_time(race_name, now)
+            feed.tracks[race_name] = re.sub(r"^\d{1,2}:\d{2}\s+", "", race_name)
+
+            for horse in race.horses:
+                if horse is None:
+                    feed.skipped += 1
+                    continue
+                if not horse.active or not horse.name or horse.EW is None:
+                    continue
+
+                odds = horse.EW.decimal or horse.EW.fractional
+                if odds:
+                    decimal_odds = to_decimal(odds)
+                    if decimal_odds is None:
+                        feed.skipped += 1
+                        continue
+                    feed.add(self.normalize_key(race_name, horse.name), race_name, horse.name, decimal_odds)
+
+        if len(feed.runners) > 1000:
+            raw_total = sum(len(r.horses) for r in active_races)
+            logger.error(f"🚨 WILLIAM HILL DEBUG: Deduplication failed! Raw: {raw_total}, After: {len(feed.runners)}")
+        return feed
+
+# Registered adapters, polled in this order
+ADAPTERS = {}
+
+def register(adapter: BookmakerAdapter):
+    ADAPTERS[adapter.name] = adapter
+    return adapter
+
+register(Bet365Adapter())
+register(WilliamHillAdapter())
+
+def parse_payload(name: str, content: bytes, now: float) -> tuple:
+    """(feed, decode seconds, parse seconds) for one raw payload; runs in the parse pool"""
+    adapter = ADAPTERS[name]
+    started = time.perf_counter()
+    data = adapter.decode(content)
+    decoded = time.perf_counter()
+    feed = adapter.parse(data, now)
+    return feed, decoded - started, time.perf_counter() - decoded
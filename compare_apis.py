@@ -1,7 +1,28 @@
 #!/usr/bin/env python3
+"""
+Compare the Bet365 and William Hill race feeds
+
+With no arguments, fetches both APIs once, saves the raw payloads as
+<bookmaker>_raw_<timestamp>.json captures and prints a comparison. With
+--batch, analyses a directory or archive (.zip, .tar, .tar.gz, ...) of such
+captures across a process pool and writes a compact columnar result file:
+
+    python compare_apis.py --batch captures/ --output meeting.json
+"""
+
+import argparse
 import asyncio
+import gzip
 import httpx
 import json
+import logging
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
 
 async def fetch_and_compare():
@@ -24,14 +45,14 @@ async def fetch_and_compare():
         bet365_data = bet365_response.json() if bet365_response.status_code == 200 else {}
         william_hill_data = william_hill_response.json() if william_hill_response.status_code == 200 else {}
         
-        # Save raw responses
-        timestamp = datetime.now().strftime("%H%M%S")
+        # Save raw responses byte for byte, so they replay and batch-analyse exactly
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        with open(f"bet365_raw_{timestamp}.json", "w") as f:
-            json.dump(bet365_data, f, indent=2)
+        with open(f"bet365_raw_{timestamp}.json", "wb") as f:
+            f.write(bet365_response.content if bet365_response.status_code == 200 else b"{}")
         
-        with open(f"william_hill_raw_{timestamp}.json", "w") as f:
-            json.dump(william_hill_data, f, indent=2)
+        with open(f"william_hill_raw_{timestamp}.json", "wb") as f:
+            f.write(william_hill_response.content if william_hill_response.status_code == 200 else b"{}")
         
         # Analyze Bet365
         bet365_races = bet365_data.get("races", [])
@@ -114,5 +135,189 @@ async def fetch_and_compare():
         print(f"   bet365_raw_{timestamp}.json")
         print(f"   william_hill_raw_{timestamp}.json")
 
+# Batch mode: <bookmaker>_raw_<capture>.json, optionally .gz or .br compressed
+CAPTURE_NAME = re.compile(r"^(?P<bookmaker>.+?)_raw_(?P<capture>.+?)\.json(?P<compression>\.gz|\.br)?$")
+FILE_COLUMNS = ("file", "capture", "bookmaker", "bytes", "ok", "error", "races", "active_races", "raw_runners", "runners", "skipped", "decode_ms", "parse_ms")
+
+def quiet_worker():
+    # Scaled or odd payloads trip the adapters' debug logging on every file
+    logging.getLogger("bookmakers").setLevel(logging.CRITICAL)
+
+def race_names(bookmaker: str, data) -> set:
+    """Lowercased raw race names, as the live comparison counts them"""
+    if bookmaker == "bet365":
+        return {race.league.lower() for race in data.races if race.league}
+    if bookmaker == "william_hill":
+        return {race.name.lower() for race in data.races if race.name and not race.settled}
+    return set()
+
+def analyze_capture(name: str, source, mtime: float) -> dict:
+    """Per-file statistics for one capture; `source` is its path or its bytes"""
+    from bookmakers import ADAPTERS
+    from matching import canonical_race_id
+    
+    match = CAPTURE_NAME.match(os.path.basename(name))
+    result = dict.fromkeys(FILE_COLUMNS, 0)
+    result.update(file=name, capture=match["capture"], bookmaker=match["bookmaker"], ok=False, error=None)
+    result.update(race_names=[], race_ids=[])
+    try:
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                source = f.read()
+        if match["compression"] == ".gz":
+            source = gzip.decompress(source)
+        elif match["compression"] == ".br":
+            import brotli
+            source = brotli.decompress(source)
+        result["bytes"] = len(source)
+        
+        adapter = ADAPTERS[match["bookmaker"]]
+        started = time.perf_counter()
+        data = adapter.decode(source)
+        decoded = time.perf_counter()
+        feed = adapter.parse(data, mtime)
+        result["decode_ms"] = round((decoded - started) * 1000, 3)
+        result["parse_ms"] = round((time.perf_counter() - decoded) * 1000, 3)
+        
+        races = getattr(data, "races", [])
+        active = [race for race in races if not getattr(race, "settled", False)]
+        result.update(
+            ok=True,
+            races=len(races),
+            active_races=len(active),
+            raw_runners=sum(len(race.horses) for race in active),
+            runners=len(feed.runners),
+            skipped=feed.skipped,
+            race_names=sorted(race_names(adapter.name, data)),
+            race_ids=sorted({
+                race_id for race, off in feed.off_times.items()
+                if (race_id := canonical_race_id(feed.tracks.get(race), off)) is not None
+            })
+        )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"[:200]
+    return result
+
+def iter_captures(path: str):
+    """(name, path or bytes, mtime) per capture file in a directory or archive, streamed"""
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for file in sorted(files):
+                if CAPTURE_NAME.match(file):
+                    full = os.path.join(root, file)
+                    yield full, full, os.path.getmtime(full)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if CAPTURE_NAME.match(os.path.basename(info.filename)):
+                    yield info.filename, archive.read(info), datetime(*info.date_time).timestamp()
+    else:
+        # Stream mode reads compressed tars front to back without seeking
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and CAPTURE_NAME.match(os.path.basename(member.name)):
+                    yield member.name, archive.extractfile(member).read(), member.mtime
+
+def run_pool(captures, workers: int):
+    """analyze_capture() over the captures, with a bounded number of files in flight"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=quiet_worker) as pool:
+        in_flight = set()
+        for capture in captures:
+            if len(in_flight) >= workers * 4:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+            in_flight.add(pool.submit(analyze_capture, *capture))
+        for future in in_flight:
+            yield future.result()
+
+def summarize_batch(files: list, bookmakers: list) -> tuple:
+    """(per-capture columns, aggregate summary) from per-file results"""
+    by_capture = {}
+    for result in files:
+        if result["ok"]:
+            by_capture.setdefault(result["capture"], {})[result["bookmaker"]] = result
+    
+    captures = {"capture": [], "matched_races": [], "all_races": [], "common_race_names": []}
+    for bookmaker in bookmakers:
+        captures[f"{bookmaker}_runners"] = []
+        captures[f"{bookmaker}_coverage"] = []
+    
+    for capture in sorted(by_capture):
+        results = by_capture[capture]
+        race_sets = {bookmaker: set(results[bookmaker]["race_ids"]) if bookmaker in results else set() for bookmaker in bookmakers}
+        all_races = set().union(*race_sets.values())
+        name_sets = [set(results[bookmaker]["race_names"]) for bookmaker in bookmakers if bookmaker in results]
+        captures["capture"].append(capture)
+        captures["matched_races"].append(len(set.intersection(*race_sets.values())) if race_sets else 0)
+        captures["all_races"].append(len(all_races))
+        captures["common_race_names"].append(len(set.intersection(*name_sets)) if len(name_sets) > 1 else 0)
+        for bookmaker in bookmakers:
+            captures[f"{bookmaker}_runners"].append(results[bookmaker]["runners"] if bookmaker in results else None)
+            coverage = len(race_sets[bookmaker]) / len(all_races) if all_races and bookmaker in results else None
+            captures[f"{bookmaker}_coverage"].append(None if coverage is None else round(coverage, 4))
+    
+    summary = {"files": len(files), "failed": sum(not result["ok"] for result in files), "captures": len(by_capture), "bookmakers": {}}
+    for bookmaker in bookmakers:
+        ok = [result for result in files if result["bookmaker"] == bookmaker and result["ok"]]
+        failed = sum(1 for result in files if result["bookmaker"] == bookmaker and not result["ok"])
+        coverage = [value for value in captures[f"{bookmaker}_coverage"] if value is not None]
+        raw = sum(result["raw_runners"] for result in ok)
+        summary["bookmakers"][bookmaker] = {
+            "files": len(ok) + failed,
+            "failed": failed,
+            "mean_runners": round(sum(result["runners"] for result in ok) / len(ok), 1) if ok else 0,
+            "skipped_runners": sum(result["skipped"] for result in ok),
+            "skip_rate": round(sum(result["skipped"] for result in ok) / raw, 5) if raw else 0,
+            "mean_coverage": round(sum(coverage) / len(coverage), 4) if coverage else None,
+            "mean_decode_ms": round(sum(result["decode_ms"] for result in ok) / len(ok), 3) if ok else 0,
+            "mean_parse_ms": round(sum(result["parse_ms"] for result in ok) / len(ok), 3) if ok else 0
+        }
+    matched = captures["matched_races"]
+    summary["mean_matched_races"] = round(sum(matched) / len(matched), 1) if matched else 0
+    return captures, summary
+
+def run_batch(path: str, output: str, workers: int):
+    """Analyse every capture under `path` and write {summary, captures, files} as columns"""
+    from bookmakers import ADAPTERS
+    
+    started = time.perf_counter()
+    files = []
+    for result in run_pool(iter_captures(path), workers):
+        files.append(result)
+        if len(files) % 500 == 0:
+            print(f"   ...{len(files)} files")
+    files.sort(key=lambda result: (result["capture"], result["bookmaker"]))
+    
+    bookmakers = [name for name in ADAPTERS if any(result["bookmaker"] == name for result in files)]
+    captures, summary = summarize_batch(files, bookmakers)
+    elapsed = time.perf_counter() - started
+    summary.update(source=path, workers=workers, seconds=round(elapsed, 2))
+    
+    columns = {column: [result[column] for result in files] for column in FILE_COLUMNS}
+    with open(output, "w") as f:
+        json.dump({"summary": summary, "captures": captures, "files": columns}, f, separators=(",", ":"))
+    
+    print(f"\n📊 BATCH ANALYSIS: {summary['files']} files, {summary['captures']} captures, {summary['failed']} failed in {elapsed:.1f}s ({workers} workers)")
+    for bookmaker, stats in summary["bookmakers"].items():
+        print(f"   {bookmaker}: {stats['files']} files, {stats['mean_runners']} runners avg, "
+              f"{stats['skipped_runners']} skipped, coverage {stats['mean_coverage']}")
+    print(f"   Matched races per capture: {summary['mean_matched_races']}")
+    print(f"\n📁 Results saved to {output}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Bet365 and William Hill race feeds")
+    parser.add_argument("--batch", metavar="PATH", help="directory or archive of <bookmaker>_raw_*.json captures to analyse offline")
+    parser.add_argument("--output", help="batch result file (default compare_batch_<timestamp>.json)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="analysis processes (default: all cores)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    asyncio.run(fetch_and_compare()) 
\ No newline at end of file
+    args = parse_args()
+    if args.batch:
+        if not os.path.exists(args.batch):
+            sys.exit(f"❌ No such directory or archive: {args.batch}")
+        output = args.output or f"compare_batch_{datetime.now():%Y%m%d_%H%M%S}.json"
+        print(f"🔍 Analysing captures in {args.batch}...")
+        run_batch(args.batch, output, max(args.workers, 1))
+    else:
+        asyncio.run(fetch_and_compare()) 
\ No newline at end of file
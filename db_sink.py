@@ -0,0 +1,331 @@
+"""
+Change-only database sink for the Fast Odds API
+
+Replaces the JS updaters' second and third poll of the upstream: each cycle's
+runner changes from update_odds() are coalesced per runner into a bounded
+pending batch, and a background writer flushes it to the bookmaker's
+`*_fast_odds` table in bulk - one UPDATE ... FROM unnest(...) per table on
+Postgres, one executemany on SQLite for local runs. The poll loop only ever
+touches the in-memory batch, so a slow database delays writes, never polls.
+
+Like the JS updaters, runners are matched to the day's seeded rows by folded
+horse name and track, and only matched rows are written. The SQLite backend
+owns its table, so there unmatched runners are inserted instead.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from bookmakers import UK_TZ
+from matching import normalize_track
+from metrics import Counter, Histogram
+from odds_store import fold_name
+
+logger = logging.getLogger(__name__)
+
+db_rows_written = Counter("fast_odds_db_rows_written_total", "Runner rows written per table", ("table",))
+db_rows_unmatched = Counter("fast_odds_db_rows_unmatched_total", "Runner changes with no seeded row to write to", ("table",))
+db_rows_dropped = Counter("fast_odds_db_rows_dropped_total", "Runner changes dropped because the pending batch was full")
+db_write_seconds = Histogram("fast_odds_db_write_seconds", "Time per bulk write", ("table",))
+
+PRICE_STEP = 0.01  # smaller moves are not changes, as in the JS updaters
+
+def table_for(bookmaker: str) -> str:
+    """e.g. william_hill -> williamhill_fast_odds"""
+    return bookmaker.replace("_", "") + "_fast_odds"
+
+def update_sql(table: str, source: str) -> str:
+    """Bulk update of seeded rows from `source` (id, odds, stamp, is_active)
+
+    A NULL odds marks a runner that left the card: it is only deactivated.
+    As in the JS updaters, odds, previous_odds and odds_changed_at move only
+    when the price moves by more than 0.01.
+    """
+    moved = f"u.odds IS NOT NULL AND ({table}.odds IS NULL OR ABS({table}.odds - u.odds) > {PRICE_STEP})"
+    return (
+        f"UPDATE {table} SET "
+        f"previous_odds = CASE WHEN {moved} THEN {table}.odds ELSE {table}.previous_odds END, "
+        f"odds_changed_at = CASE WHEN {moved} THEN u.stamp ELSE {table}.odds_changed_at END, "
+        f"odds = CASE WHEN {moved} THEN u.odds ELSE {table}.odds END, "
+        f"last_updated_at = u.stamp, "
+        f"is_active = u.is_active "
+        f"FROM {source} WHERE {table}.id = u.id"
+    )
+
+class PostgresBackend:
+    """asyncpg pool; each batch is a single round trip"""
+
+    seeds_rows = False
+
+    def __init__(self, url: str):
+        self.url = url
+        self.pool = None
+
+    async def connect(self):
+        import asyncpg
+        self.pool = await asyncpg.create_pool(self.url, min_size=1, max_size=2)
+
+    async def day_rows(self, table: str, race_date) -> list:
+        """(id, track_name, horse_name) of the rows seeded for a race date"""
+        rows = await self.pool.fetch(f"SELECT id, track_name, horse_name FROM {table} WHERE race_date = $1", race_date)
+        return [(row["id"], row["track_name"], row["horse_name"]) for row in rows]
+
+    async def update(self, table: str, rows: list):
+        ids, odds, stamps, active = zip(*rows)
+        source = "unnest($1::bigint[], $2::float8[], $3::timestamptz[], $4::bool[]) AS u(id, odds, stamp, is_active)"
+        await self.pool.execute(update_sql(table, source), ids, odds, stamps, active)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+class SQLiteBackend:
+    """Local file database for development; creates and seeds the tables it writes to"""
+
+    seeds_rows = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = None
+        self.tables = set()
+
+    async def connect(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+    def _ensure_table(self, table: str):
+        if table in self.tables:
+            return
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id INTEGER PRIMARY KEY, race_date TEXT NOT NULL, track_name TEXT NOT NULL, horse_name TEXT NOT NULL, "
+            "race_time TEXT, odds REAL, previous_odds REAL, odds_changed_at TEXT, last_updated_at TEXT, is_active INTEGER)"
+        )
+        self.tables.add(table)
+
+    def _day_rows(self, table: str, race_date) -> list:
+        self._ensure_table(table)
+        return self.connection.execute(
+            f"SELECT id, track_name, horse_name FROM {table} WHERE race_date = ?", (race_date.isoformat(),)
+        ).fetchall()
+
+    def _update(self, table: str, rows: list):
+        # No unnest() in SQLite, so the batch is staged in a temp table to update from
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS u (id INTEGER PRIMARY KEY, odds REAL, stamp TEXT, is_active INTEGER)")
+            self.connection.execute("DELETE FROM u")
+            self.connection.executemany(
+                "INSERT INTO u VALUES (?, ?, ?, ?)",
+                [(row_id, odds, stamp.isoformat(), int(active)) for row_id, odds, stamp, active in rows]
+            )
+            self.connection.execute(update_sql(table, "u"))
+
+    def _insert(self, table: str, rows: list):
+        self._ensure_table(table)
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO {table} (race_date, track_name, horse_name, race_time, odds, odds_changed_at, last_updated_at, is_active) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (race_date.isoformat(), track, horse, race_time, odds, stamp.isoformat(), stamp.isoformat(), int(active))
+                    for race_date, track, horse, race_time, odds, stamp, active in rows
+                ]
+            )
+
+    async def day_rows(self, table: str, race_date) -> list:
+        return await asyncio.to_thread(self._day_rows, table, race_date)
+
+    async def update(self, table: str, rows: list):
+        await asyncio.to_thread(self._update, table, rows)
+
+    async def insert(self, table: str, rows: list):
+        await asyncio.to_thread(self._insert, table, rows)
+
+    async def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+def create_backend(url: str):
+    """Backend for a postgres:// / postgresql:// or sqlite:///path URL"""
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported DB_SINK_URL scheme: {url.split(':', 1)[0]}")
+
+class OddsSink:
+    """Coalesces runner changes per row and writes them in bulk from a background task"""
+
+    def __init__(self, backend, race_info, batch_size: int = 1000, max_pending: int = 50000,
+                 interval: float = 1.0, cache_seconds: float = 300, retry_seconds: float = 30):
+        self.backend = backend
+        self.race_info = race_info  # (bookmaker, race) -> (track, off_time)
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.interval = interval
+        self.cache_seconds = cache_seconds
+        self.retry_seconds = retry_seconds
+        self.pending = {}           # (table, race_date, track key, folded horse) -> row
+        self.seeded = {}            # (table, race_date) -> (loaded at, {(track key, folded horse): id})
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.flushing = None
+        self.connected = False
+
+    def submit(self, changes: list, now: float):
+        """Fold one cycle's changes into the pending batch; never blocks"""
+        if not changes:
+            return
+        stamp = datetime.fromtimestamp(now, timezone.utc)
+        today = datetime.fromtimestamp(now, UK_TZ)
+        for change in changes:
+            track, off_time = self.race_info(change["bookmaker"], change["race"])
+            off = datetime.fromtimestamp(off_time, UK_TZ) if off_time is not None else today
+            track = track or change["race"]
+            key = (table_for(change["bookmaker"]), off.date(), normalize_track(track), fold_name(change["horse"]))
+            if key not in self.pending and len(self.pending) >= self.max_pending:
+                db_rows_dropped.inc()
+                continue
+            self.pending[key] = (
+                track,
+                change["horse"],
+                f"{off:%H:%M}" if off_time is not None else None,
+                None if change["odds"] is None else round(change["odds"], 2),  # toFixed(2), like the JS updaters
+                stamp,
+                change["odds"] is not None
+            )
+        self.wakeup.set()
+
+    async def _seeded_ids(self, table: str, race_date, refresh: bool = False) -> dict:
+        """{(track key, folded horse): id} for the day's rows, reloaded every cache_seconds"""
+        cached = self.seeded.get((table, race_date))
+        if cached is not None and not refresh and time.time() - cached[0] < self.cache_seconds:
+            return cached[1]
+        ids = {}
+        for row_id, track, horse in await self.backend.day_rows(table, race_date):
+            ids.setdefault((normalize_track(track), fold_name(horse)), row_id)
+        today = datetime.now(UK_TZ).date()
+        self.seeded = {key: value for key, value in self.seeded.items() if key[1] >= today}
+        self.seeded[(table, race_date)] = (time.time(), ids)
+        return ids
+
+    async def flush(self):
+        """Write everything pending, in batches of batch_size rows per table"""
+        pending, self.pending = self.pending, {}
+        self.wakeup.clear()
+        by_table = {}
+        for key, row in pending.items():
+            by_table.setdefault(key[0], []).append((key, row))
+
+        tables = list(by_table)
+        for index, table in enumerate(tables):
+            try:
+                await self._flush_table(table, by_table[table])
+            except BaseException:
+                # Nothing may be lost: this table's changes and every later one's go back in
+                # (rewriting a row with the same values is harmless)
+                for table in tables[index:]:
+                    self._requeue(by_table[table])
+                raise
+
+    async def _flush_table(self, table: str, entries: list):
+        matched, updates, unmatched = [], [], []
+        for key, row in entries:
+            ids = await self._seeded_ids(table, key[1])
+            row_id = ids.get(key[2:])
+            if row_id is None:
+                unmatched.append((key, row))
+            else:
+                track, horse, race_time, odds, stamp, active = row
+                matched.append((key, row))
+                updates.append((row_id, odds, stamp, active))
+
+        if unmatched and self.backend.seeds_rows:
+            seeds = [(key[1], *row) for key, row in unmatched if row[3] is not None]
+            await self._write(table, self.backend.insert, seeds, unmatched)
+            for race_date in {key[1] for key, _ in unmatched}:
+                await self._seeded_ids(table, race_date, refresh=True)
+        elif unmatched:
+            db_rows_unmatched.inc(table, amount=len(unmatched))
+
+        await self._write(table, self.backend.update, updates, matched)
+
+    async def _write(self, table: str, write, rows: list, entries: list):
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            started = time.perf_counter()
+            try:
+                await write(table, batch)
+            except Exception as e:
+                logger.error(f"❌ {table}: bulk write of {len(batch)} rows failed: {e!r}")
+                self._requeue(entries)
+                return
+            db_write_seconds.observe(table, value=time.perf_counter() - started)
+            db_rows_written.inc(table, amount=len(batch))
+
+    def _requeue(self, entries: list):
+        """Put failed changes back unless a newer one for the runner is already pending"""
+        for key, row in entries:
+            if key not in self.pending and len(self.pending) < self.max_pending:
+                self.pending[key] = row
+        if self.pending:
+            self.wakeup.set()
+
+    async def connect(self):
+        """Connect the backend, retrying until the database is reachable"""
+        while True:
+            try:
+                await self.backend.connect()
+                break
+            except Exception as e:
+                logger.error(f"❌ Odds sink cannot connect ({e!r}), retrying in {self.retry_seconds:.0f}s")
+                await asyncio.sleep(self.retry_seconds)
+        self.connected = True
+        logger.info(f"🗄️ Odds sink writing changes to {type(self.backend).__name__.removesuffix('Backend')}")
+
+    async def run(self):
+        """Background writer: flushes whenever changes are pending, at most once per interval"""
+        await self.connect()
+        while True:
+            await self.wakeup.wait()
+            # Shielded so that cancelling the writer never abandons a write half-way
+            self.flushing = asyncio.create_task(self.flush())
+            try:
+                await asyncio.shield(self.flushing)
+            except Exception as e:
+                logger.error(f"❌ Odds sink flush failed: {e!r}")
+                await asyncio.sleep(self.retry_seconds)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the writer; a database that is down only delays writes, never startup"""
+        self.task = asyncio.create_task(self.run())
+
+    async def _final_flush(self):
+        # A write still running finishes first; if it fails its rows are back in pending
+        if self.flushing is not None:
+            try:
+                await self.flushing
+            except Exception:
+                pass
+        await self.flush()
+
+    async def close(self, timeout: float = 10):
+        """Stop the writer after a last flush"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if not self.connected:
+            if self.pending:
+                logger.error(f"❌ Odds sink never connected, {len(self.pending)} changes not written")
+            return
+        try:
+            await asyncio.wait_for(self._final_flush(), timeout)
+        except Exception as e:
+            logger.error(f"❌ Odds sink final flush failed: {e!r}")
+        await self.backend.close()
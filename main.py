@@ -5,11 +5,34 @@ Returns exactly 1 entry per horse per race
 """
 
 import asyncio
+import brotli
+import gzip
+import hashlib
 import httpx
+import json
 import logging
+import msgspec
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
 from datetime import datetime, timezone
-from fastapi import FastAPI
+from typing import Literal
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from bookmakers import ADAPTERS, UK_TZ, parse_payload
+from db_sink import OddsSink, create_backend
+from markets import compute_markets
+from matching import RunnerMatcher, canonical_race_id
+from metrics import LATENCY_BUCKETS, PROCESSING_BUCKETS, SIZE_BUCKETS, Counter, Gauge, Histogram, MetricsMiddleware, render_metrics
+from odds_query import DEFAULT_FIELDS, FIELD_VALUES, QueryFilters, build_indexes, run_query
+from odds_store import HorseIndex, OddsStore, fold_name
+from price_history import PriceHistory
+from shared_snapshot import SnapshotReader, default_snapshot_path, write_snapshot
+from warm_start import read_warm_start, snapshot_columns, write_warm_start
 
 # Configure logging
 logging.basicConfig(
@@ -18,7 +41,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Fast WIN Odds API", version="2.0")
+json_encoder = msgspec.json.Encoder()
+
+class FastJSONResponse(Response):
+    """JSON response encoded with msgspec; returned directly it also skips FastAPI's jsonable_encoder pass"""
+    
+    media_type = "application/json"
+    
+    def render(self, content) -> bytes:
+        return json_encoder.encode(content)
+
+app = FastAPI(title="Fast WIN Odds API", version="2.0", default_response_class=FastJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,17 +61,146 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, routes=app.routes)
 
-# Global storage
+# Process role: "standalone" polls and serves. In split mode a single "poller"
+# publishes every snapshot to SHARED_SNAPSHOT_PATH and any number of "worker"
+# processes (e.g. uvicorn --workers N) serve it without polling upstream
+ODDS_ROLE = os.getenv("ODDS_ROLE", "standalone")
+if ODDS_ROLE not in ("standalone", "poller", "worker"):
+    raise ValueError(f"ODDS_ROLE must be standalone, poller or worker, not {ODDS_ROLE!r}")
+SHARED_SNAPSHOT_PATH = os.getenv("SHARED_SNAPSHOT_PATH") or default_snapshot_path()
+SHARED_POLL_INTERVAL = float(os.getenv("SHARED_POLL_INTERVAL", "0.1"))
+snapshot_reader = SnapshotReader(SHARED_SNAPSHOT_PATH)
+
+# Global storage (runners live in odds_stores)
 odds_data = {
-    "bet365": [],
-    "william_hill": [],
-    "last_updated": None,
+    "last_updated": None,  # when the odds last changed; part of the cached bodies, so it moves with the ETag
     "update_count": 0
 }
 
 updating = False
 
+# Pre-rendered response bodies, rebuilt once per update cycle
+response_cache = {}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Per-cycle runner deltas as (seq, changes), seq being the update_count of the cycle
+CHANGE_FEED_CYCLES = int(os.getenv("CHANGE_FEED_CYCLES", "720"))
+change_feed = deque(maxlen=CHANGE_FEED_CYCLES)
+
+# Live push subscribers (SSE and WebSocket)
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "32"))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+STREAM_SEND_TIMEOUT = float(os.getenv("STREAM_SEND_TIMEOUT", "10"))
+subscribers = set()
+
+# Per-runner price history: in-memory rings over daily files
+# (workers read the poller's files, so every process answers the same)
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")
+HISTORY_RING_SIZE = int(os.getenv("HISTORY_RING_SIZE", "128"))
+price_history = PriceHistory(HISTORY_DIR, HISTORY_RING_SIZE, read_only=ODDS_ROLE == "worker")
+
+# Adaptive polling: seconds-to-off thresholds and the poll interval inside each
+POLL_TIERS = [(120, 2), (600, 5), (1800, 15), (3600, 30)]
+POLL_IDLE_INTERVAL = float(os.getenv("POLL_IDLE_INTERVAL", "60"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "120"))
+POLL_OFF_GRACE = 120  # keep polling tightly for a couple of minutes after the off
+
+# On-demand refreshes for ?max_age=: requests and the background updater share each source's in-flight fetch
+MAX_AGE_FLOOR = float(os.getenv("MAX_AGE_FLOOR", "0.5"))  # smaller max_age values are raised to this
+refresh_flights = {}  # source -> task of the update fetching it right now
+cycle_lock = asyncio.Lock()
+
+# Concurrent fetching and per-source circuit breakers
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "60"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "900"))  # drop a failing source's odds after this
+fetch_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+# Payload decode and parse run off the event loop: "thread" (default), "process" or "inline"
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+if PARSE_EXECUTOR == "thread":
+    parse_executor = ThreadPoolExecutor(PARSE_WORKERS, thread_name_prefix="parse")
+elif PARSE_EXECUTOR == "process":
+    parse_executor = ProcessPoolExecutor(PARSE_WORKERS, mp_context=get_context("forkserver"))
+elif PARSE_EXECUTOR == "inline":
+    parse_executor = None
+else:
+    raise ValueError(f"PARSE_EXECUTOR must be thread, process or inline, not {PARSE_EXECUTOR!r}")
+
+# Per-source poll health and race off times seen in the latest payload
+source_state = {
+    source: {
+        "failures": 0,
+        "unchanged": 0,
+        "skipped": 0,
+        "payload_hash": None,
+        "off_times": {},
+        "tracks": {},
+        "circuit": "closed",
+        "open_until": 0.0,
+        "last_success": None,
+        "restored": False  # serving a warm-start snapshot, not yet refreshed
+    }
+    for source in ADAPTERS
+}
+
+# Prometheus metrics for the fetch/parse pipeline and the event loop (see /metrics)
+EVENT_LOOP_PROBE_INTERVAL = float(os.getenv("EVENT_LOOP_PROBE_INTERVAL", "0.5"))
+upstream_seconds = Histogram("fast_odds_upstream_latency_seconds", "Upstream request latency per source", ("source",))
+payload_bytes = Histogram("fast_odds_payload_size_bytes", "Upstream payload size per source", ("source",), SIZE_BUCKETS)
+decode_seconds = Histogram("fast_odds_json_decode_seconds", "JSON decode time per source", ("source",), PROCESSING_BUCKETS)
+parse_seconds = Histogram("fast_odds_parse_seconds", "Adapter parse time per source", ("source",), PROCESSING_BUCKETS)
+parse_handoff_seconds = Histogram(
+    "fast_odds_parse_handoff_seconds", "Latency the parse pool adds per payload (queueing and transfer)", ("source",), PROCESSING_BUCKETS
+)
+fetches_total = Counter("fast_odds_fetches_total", "Fetch attempts per source by outcome", ("source", "outcome"))
+skipped_runners_total = Counter("fast_odds_skipped_runners_total", "Unparseable runners dropped per source", ("source",))
+cycle_seconds = Histogram("fast_odds_update_cycle_seconds", "Wall time of one update cycle", buckets=LATENCY_BUCKETS)
+loop_lag_seconds = Histogram("fast_odds_event_loop_lag_seconds", "How late the event loop ran a timer", buckets=PROCESSING_BUCKETS)
+loop_lag_latest = Gauge("fast_odds_event_loop_lag_latest_seconds", "Event loop lag at the latest probe")
+
+# Change-only writes to the *_fast_odds tables: postgresql://... or sqlite:///path, unset to disable
+DB_SINK_URL = os.getenv("DB_SINK_URL")
+DB_SINK_BATCH_SIZE = int(os.getenv("DB_SINK_BATCH_SIZE", "1000"))
+DB_SINK_MAX_PENDING = int(os.getenv("DB_SINK_MAX_PENDING", "50000"))
+DB_SINK_INTERVAL = float(os.getenv("DB_SINK_INTERVAL", "1"))
+odds_sink = None
+Gauge(
+    "fast_odds_db_pending_rows", "Runner changes waiting for the database writer",
+    collect=lambda: {(): len(odds_sink.pending)} if odds_sink is not None else {}
+)
+
+# Last good snapshot on local disk, loaded on boot so restarts serve odds at once
+WARM_START_PATH = os.getenv("WARM_START_PATH", "odds_snapshot.bin")
+warm_start_save = None  # background write of the latest snapshot
+
+# Distinguishes ETags across restarts, since update_count starts again at 0
+BOOT_ID = format(int(time.time()), "x")
+
+# Upstream connection settings (override via environment)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "10"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "5"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# One long-lived client per upstream so connections survive between cycles
+http_clients = {}
+connection_stats = {
+    source: {"requests": 0, "new_connections": 0, "reused_connections": 0}
+    for source in ADAPTERS
+}
+
+# Columnar odds per bookmaker and the horse-name index over them
+odds_stores = {bookmaker: OddsStore(bookmaker) for bookmaker in ADAPTERS}
+horse_index = HorseIndex()
+
 def is_racing_hours() -> bool:
     """Check if it's UK racing time (7AM-9PM UTC)"""
     try:
@@ -54,247 +216,1120 @@ def is_racing_hours() -> bool:
         logger.error(f"❌ Time check failed: {e} - Defaulting to racing hours")
         return True  # Default to always racing in case of timezone issues
 
-async def fetch_bet365():
-    """Fetch Bet365 WIN odds - 1 entry per horse"""
-    try:
-        url = "http://116.202.109.99/v2/bet365/sports/horse-racing/races"
-        headers = {
-            "accept": "*/*",
-            "x-rapidapi-proxy-secret": "84cc5f87-13fa-4333-b8ba-1b92674f41d7"
-        }
+def create_http_client() -> httpx.AsyncClient:
+    """Build a pooled keep-alive client for one upstream"""
+    limits = httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=UPSTREAM_HTTP2)
+
+def get_http_client(source: str) -> httpx.AsyncClient:
+    """Return the shared client for a source, creating it on first use"""
+    client = http_clients.get(source)
+    if client is None or client.is_closed:
+        client = create_http_client()
+        http_clients[source] = client
+    return client
+
+async def close_http_clients():
+    """Close every shared upstream client"""
+    for client in http_clients.values():
+        await client.aclose()
+    http_clients.clear()
+
+async def upstream_get(source: str, url: str, headers: dict) -> httpx.Response:
+    """GET through the shared client, counting new vs reused connections"""
+    opened_connection = False
+    
+    async def trace(event, info):
+        nonlocal opened_connection
+        if event == "connection.connect_tcp.complete":
+            opened_connection = True
+    
+    response = await get_http_client(source).get(url, headers=headers, extensions={"trace": trace})
+    
+    stats = connection_stats[source]
+    stats["requests"] += 1
+    if opened_connection:
+        stats["new_connections"] += 1
+    else:
+        stats["reused_connections"] += 1
+    return response
+
+def payload_unchanged(source: str, content: bytes) -> bool:
+    """True when a source returned byte-for-byte the same payload as last time"""
+    state = source_state[source]
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    if digest == state["payload_hash"]:
+        state["unchanged"] += 1
+        return True
+    state["payload_hash"] = digest
+    state["unchanged"] = 0
+    return False
+
+def record_fetch_success(source: str):
+    state = source_state[source]
+    state["failures"] = 0
+    state["circuit"] = "closed"
+    state["last_success"] = time.time()
+    state["restored"] = False
+
+def record_fetch_failure(source: str):
+    """Count a failure, opening the circuit once failures pile up"""
+    state = source_state[source]
+    state["failures"] += 1
+    state["payload_hash"] = None
+    if state["circuit"] == "half_open" or state["failures"] >= CIRCUIT_FAILURE_THRESHOLD:
+        if state["circuit"] != "open":
+            logger.error(f"🚨 {source}: circuit open for {CIRCUIT_RESET_SECONDS:.0f}s after {state['failures']} failures")
+        state["circuit"] = "open"
+        state["open_until"] = time.time() + CIRCUIT_RESET_SECONDS
+
+def race_info(bookmaker: str, race: str) -> tuple:
+    """(track, off time) for a bookmaker's race label, from its latest payload"""
+    state = source_state[bookmaker]
+    return state["tracks"].get(race), state["off_times"].get(race)
+
+runner_matcher = RunnerMatcher(race_info)
+
+def race_meta(bookmaker: str, race: str) -> tuple:
+    """(canonical race id, track) for a bookmaker's race label"""
+    cached = runner_matcher.race_ids.get((bookmaker, race))
+    if cached is not None:
+        return cached[0], cached[1]
+    track, off_time = race_info(bookmaker, race)
+    return canonical_race_id(track, off_time), track
+
+# Per-bookmaker indexes behind filtered /odds queries, rebuilt at the end of every cycle
+query_indexes = {}
+ODDS_QUERY_PARAMS = {"bookmaker", "race", "track", "min_odds", "max_odds", "updated_since", "fields", "limit", "cursor"}
+ODDS_QUERY_MAX_LIMIT = int(os.getenv("ODDS_QUERY_MAX_LIMIT", "5000"))
+
+# Per-race market metrics, recomputed at the end of every cycle
+market_data = {}
+
+def snapshot_age(source: str, now: float):
+    """Seconds since a source last fetched successfully, or None if it never has"""
+    last_success = source_state[source]["last_success"]
+    return None if last_success is None else now - last_success
+
+Gauge(
+    "fast_odds_snapshot_age_seconds", "Seconds since each source last fetched successfully", ("source",),
+    lambda: {(source,): snapshot_age(source, time.time()) for source in source_state}
+)
+Gauge(
+    "fast_odds_skipped_runners", "Unparseable runners in each source's latest payload", ("source",),
+    lambda: {(source,): state["skipped"] for source, state in source_state.items()}
+)
+Gauge(
+    "fast_odds_circuit_open", "1 while a source's circuit breaker is open", ("source",),
+    lambda: {(source,): int(state["circuit"] == "open") for source, state in source_state.items()}
+)
+Gauge(
+    "fast_odds_runners", "Live runners per bookmaker", ("source",),
+    lambda: {(bookmaker,): len(store) for bookmaker, store in odds_stores.items()}
+)
+Gauge("fast_odds_update_count", "Sequence number of the snapshot being served", collect=lambda: {(): odds_data["update_count"]})
+Gauge("fast_odds_stream_subscribers", "Connected SSE and WebSocket clients", collect=lambda: {(): len(subscribers)})
+
+class PollScheduler:
+    """Derives each source's next poll from the nearest off and its recent results"""
+    
+    def __init__(self, sources):
+        self.next_poll = {source: 0.0 for source in sources}
+        self.plans = {}
+    
+    def nearest_off(self, now: float):
+        """(seconds to off, race) for the next race still worth polling tightly"""
+        nearest = None
+        for state in source_state.values():
+            for race, off in state["off_times"].items():
+                if off is None or off < now - POLL_OFF_GRACE:
+                    continue
+                seconds = max(off - now, 0)
+                if nearest is None or seconds < nearest[0]:
+                    nearest = (seconds, race)
+        return nearest
+    
+    def interval(self, source: str, now: float) -> tuple:
+        """Poll interval for a source and the reason for it"""
+        if not is_racing_hours():
+            return 300, "outside racing hours"
         
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                races = data.get("races", [])
-                
-                formatted = []
-                for race in races:
-                    race_name = race.get("league", "Unknown")
-                    race_num = race.get("raceNum", "")
-                    if race_num:
-                        race_name = f"Race {race_num} - {race_name}"
-                    
-                    for horse in race.get("horses", []):
-                        name = horse.get("na", "")
-                        odds = horse.get("OD", "")
-                        
-                        if name and odds and odds != "SP":
-                            try:
-                                # Convert fractional odds to decimal
-                                if "/" in str(odds):
-                                    parts = str(odds).split("/")
-                                    if len(parts) == 2:
-                                        numerator, denominator = parts
-                                        decimal_odds = (float(numerator) / float(denominator)) + 1
-                                    else:
-                                        continue
-                                else:
-                                    decimal_odds = float(odds)
-                                
-                                formatted.append({
-                                    "horse": name,
-                                    "race": race_name,
-                                    "odds": decimal_odds,
-                                    "bookmaker": "bet365"
-                                })
-                            except Exception as e:
-                                pass
-                
-                logger.info(f"✅ Bet365: {len(formatted)} horses")
-                if len(formatted) == 0:
-                    logger.error(f"🚨 BET365 DEBUG: {len(races)} races found but 0 horses parsed!")
-                    if races:
-                        sample_race = races[0]
-                        sample_horses = sample_race.get("horses", [])
-                        logger.error(f"🚨 Sample race has {len(sample_horses)} horses")
-                        if sample_horses:
-                            sample_horse = sample_horses[0]
-                            logger.error(f"🚨 Sample horse: {sample_horse}")
-                return formatted
-            else:
-                logger.error(f"❌ Bet365 error: {response.status_code}")
-                return []
-    except Exception as e:
-        logger.error(f"❌ Bet365 fetch failed: {e}")
-        return []
+        nearest = self.nearest_off(now)
+        if nearest is None:
+            interval, reason = POLL_IDLE_INTERVAL, "no upcoming offs"
+        else:
+            interval = next((tier for limit, tier in POLL_TIERS if nearest[0] <= limit), POLL_IDLE_INTERVAL)
+            reason = f"{nearest[1]} off in {int(nearest[0])}s"
+        
+        state = source_state[source]
+        if state["circuit"] == "open":
+            return max(state["open_until"] - now, 0.1), "circuit open"
+        if state["failures"]:
+            interval *= 2 ** min(state["failures"], 6)
+            reason += f", {state['failures']} consecutive failures"
+        elif state["unchanged"] >= 3:
+            interval *= min(2 ** (state["unchanged"] // 3), 4)
+            reason += f", unchanged {state['unchanged']} times"
+        return min(interval, POLL_MAX_INTERVAL), reason
+    
+    def due(self, now: float) -> list:
+        return [source for source, at in self.next_poll.items() if at <= now]
+    
+    def plan(self, sources, now: float):
+        """Schedule the next poll for sources that were just fetched"""
+        for source in sources:
+            interval, reason = self.interval(source, now)
+            self.next_poll[source] = now + interval
+            self.plans[source] = {"interval": interval, "reason": reason}
+    
+    def sleep_time(self, now: float) -> float:
+        return max(min(self.next_poll.values()) - now, 0.1)
+    
+    def snapshot(self, now: float) -> dict:
+        nearest = self.nearest_off(now)
+        return {
+            "nearest_off": None if nearest is None else {"race": nearest[1], "seconds": round(nearest[0])},
+            "sources": {
+                source: {
+                    "next_poll_in": round(max(at - now, 0), 1),
+                    "failures": source_state[source]["failures"],
+                    "circuit": source_state[source]["circuit"],
+                    "unchanged": source_state[source]["unchanged"],
+                    "known_races": len(source_state[source]["off_times"]),
+                    **self.plans.get(source, {})
+                }
+                for source, at in self.next_poll.items()
+            }
+        }
 
-async def fetch_william_hill():
-    """Fetch William Hill WIN odds - 1 entry per horse (deduplicated)"""
+poll_scheduler = PollScheduler(ADAPTERS)
+
+async def run_parse(adapter, content: bytes) -> tuple:
+    """(feed, decode seconds, parse seconds) for a payload, built in the parse pool"""
+    if parse_executor is None:
+        return parse_payload(adapter.name, content, time.time())
+    
+    started = time.perf_counter()
+    feed, decode_time, parse_time = await asyncio.get_running_loop().run_in_executor(
+        parse_executor, parse_payload, adapter.name, content, time.time()
+    )
+    parse_handoff_seconds.observe(adapter.name, value=max(time.perf_counter() - started - decode_time - parse_time, 0.0))
+    return feed, decode_time, parse_time
+
+async def fetch_bookmaker(adapter):
+    """Fetch and parse one bookmaker; None keeps its last good snapshot"""
+    state = source_state[adapter.name]
+    if state["circuit"] == "open":
+        if time.time() < state["open_until"]:
+            fetches_total.inc(adapter.name, "circuit_open")
+            return None
+        state["circuit"] = "half_open"
+    
     try:
-        url = "http://116.202.109.99/willhill/horse-racing/races"
-        headers = {
-            "x-rapidapi-proxy-secret": "84cc5f87-13fa-4333-b8ba-1b92674f41d7"
-        }
+        async with fetch_semaphore:
+            started = time.perf_counter()
+            response = await asyncio.wait_for(
+                upstream_get(adapter.name, adapter.url, adapter.headers),
+                adapter.timeout
+            )
+            upstream_seconds.observe(adapter.name, value=time.perf_counter() - started)
         
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(url, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                races = data.get("races", [])
-                active_races = [r for r in races if not r.get("settled", False)]
-                
-                # Deduplicate horses by race + name
-                unique_horses = {}
-                
-                for race in active_races:
-                    race_name = race.get("name", "Unknown")
-                    
-                    for horse in race.get("horses", []):
-                        if not horse.get("active", True):
-                            continue
-                        
-                        name = horse.get("name", "")
-                        if not name:
-                            continue
-                            
-                        horse_key = f"{race_name}|{name}"
-                        
-                        # Skip duplicates
-                        if horse_key in unique_horses:
-                            continue
-                            
-                        ew_data = horse.get("EW", {})
-                        if isinstance(ew_data, dict):
-                            odds = ew_data.get("decimal") or ew_data.get("fractional")
-                            if odds:
-                                try:
-                                    unique_horses[horse_key] = {
-                                        "horse": name,
-                                        "race": race_name,
-                                        "odds": float(odds),
-                                        "bookmaker": "william_hill"
-                                    }
-                                except:
-                                    pass
-                
-                formatted = list(unique_horses.values())
-                logger.info(f"✅ William Hill: {len(formatted)} horses")
-                if len(formatted) > 1000:
-                    raw_total = sum(len(r.get("horses", [])) for r in active_races)
-                    logger.error(f"🚨 WILLIAM HILL DEBUG: Deduplication failed! Raw: {raw_total}, After: {len(formatted)}")
-                    logger.error(f"🚨 Sample keys: {list(unique_horses.keys())[:5]}")
-                return formatted
-            else:
-                logger.error(f"❌ William Hill error: {response.status_code}")
-                return []
+        if response.status_code != 200:
+            logger.error(f"❌ {adapter.label} error: {response.status_code}")
+            fetches_total.inc(adapter.name, "http_error")
+            record_fetch_failure(adapter.name)
+            return None
+        
+        payload_bytes.observe(adapter.name, value=len(response.content))
+        if payload_unchanged(adapter.name, response.content):
+            fetches_total.inc(adapter.name, "unchanged")
+            record_fetch_success(adapter.name)
+            return None
+        
+        feed, decode_time, parse_time = await run_parse(adapter, response.content)
+        decode_seconds.observe(adapter.name, value=decode_time)
+        parse_seconds.observe(adapter.name, value=parse_time)
+        skipped_runners_total.inc(adapter.name, amount=feed.skipped)
+        fetches_total.inc(adapter.name, "ok")
+        state["off_times"] = feed.off_times
+        state["tracks"] = feed.tracks
+        state["skipped"] = feed.skipped
+        record_fetch_success(adapter.name)
+        logger.info(f"✅ {adapter.label}: {len(feed.runners)} horses")
+        return feed.runners
     except Exception as e:
-        logger.error(f"❌ William Hill fetch failed: {e}")
-        return []
+        logger.error(f"❌ {adapter.label} fetch failed: {e!r}")
+        fetches_total.inc(adapter.name, "error")
+        record_fetch_failure(adapter.name)
+        return None
 
-async def update_odds():
-    """Update odds from both APIs"""
-    global odds_data
+def last_checked():
+    """When a poll last confirmed the odds, changed or not (last_updated only moves when they change)"""
+    stamps = [state["last_success"] for state in source_state.values() if state["last_success"] is not None]
+    return datetime.fromtimestamp(max(stamps)).isoformat() if stamps else None
+
+def all_runners() -> list:
+    """Every live runner across bookmakers, in the /odds JSON shape"""
+    return [runner for store in odds_stores.values() for runner in store.runners()]
+
+def render_json(payload) -> bytes:
+    """Encode a payload as compact UTF-8 JSON, byte for byte what JSONResponse sends for finite values"""
+    return json_encoder.encode(payload)
+
+def render_with_horses(horses: bytes, fields: dict) -> bytes:
+    """Encode {"horses": [...], **fields} around an already encoded runner array"""
+    return b'{"horses":' + horses + b"," + render_json(fields)[1:]
+
+class BodyResponse(Response):
+    """Response that sends its body as given, so shared-memory views go out uncopied"""
     
-    bet365_odds, william_hill_odds = await asyncio.gather(
-        fetch_bet365(),
-        fetch_william_hill()
-    )
+    def render(self, content) -> bytes | memoryview:
+        return content
+
+def build_cached_body(body: bytes, etag: str) -> dict:
+    """Keep a rendered body alongside its gzip and brotli variants"""
+    return {
+        "etag": etag,
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=GZIP_LEVEL),
+        "br": brotli.compress(body, quality=BROTLI_QUALITY)
+    }
+
+def render_bodies() -> tuple:
+    """(etag, {key: uncompressed body}) for the snapshot endpoints"""
+    etag = f'W/"{BOOT_ID}-{odds_data["update_count"]}"'
+    last_updated = odds_data["last_updated"]
+    bodies = {}
+    
+    arrays = {bookmaker: store.encoded_runners() for bookmaker, store in odds_stores.items()}
+    for bookmaker, store in odds_stores.items():
+        bodies[bookmaker] = render_with_horses(arrays[bookmaker], {"count": len(store), "last_updated": last_updated})
+    
+    combined = b"[" + b",".join(array[1:-1] for array in arrays.values() if len(array) > 2) + b"]"
+    fields = {"total": sum(len(store) for store in odds_stores.values())}
+    fields.update({f"{bookmaker}_count": len(store) for bookmaker, store in odds_stores.items()})
+    fields["last_updated"] = last_updated
+    bodies["odds"] = render_with_horses(combined, fields)
+    
+    markets = {"markets": list(market_data.values()), "count": len(market_data), "last_updated": last_updated}
+    bodies["markets"] = render_json(markets)
+    return etag, bodies
+
+def compress_bodies(etag: str, bodies: dict) -> dict:
+    return {key: build_cached_body(body, etag) for key, body in bodies.items()}
+
+def render_responses():
+    """Rebuild the cached bodies for the snapshot endpoints"""
+    response_cache.update(compress_bodies(*render_bodies()))
+
+async def render_responses_off_loop():
+    """render_responses() with compression on a thread (zlib and brotli release the GIL)"""
+    if parse_executor is None:
+        render_responses()
+        return
+    compressed = await asyncio.to_thread(compress_bodies, *render_bodies())
+    # Swapped in whole, so readers see either the previous cycle's bodies or these
+    response_cache.update(compressed)
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Pick the best pre-compressed variant the client accepts"""
+    accepted, refused = set(), set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        quality = 1.0
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        (accepted if quality > 0 else refused).add(coding.strip())
+    
+    # "*" stands only for codings the header does not name (RFC 9110 12.5.3)
+    for coding in ("br", "gzip"):
+        if coding in accepted or ("*" in accepted and coding not in refused):
+            return coding
+    return "identity"
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(","))
+
+def cached_response(request: Request, key: str) -> Response:
+    """Serve a pre-rendered body, honouring If-None-Match and Accept-Encoding"""
+    cached = response_cache.get(key)
+    if cached is None:
+        render_responses()
+        cached = response_cache[key]
     
+    headers = {
+        "ETag": cached["etag"],
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache"
+    }
+    if any(source_state[source]["restored"] for source in ([key] if key in source_state else source_state)):
+        headers["X-Odds-Stale"] = "warm-start"
+    checked = last_checked()
+    if checked is not None:
+        # Outside the body, so confirming unchanged odds never changes the ETag
+        headers["X-Last-Checked"] = checked
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, cached["etag"]):
+        return Response(status_code=304, headers=headers)
+    
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return BodyResponse(content=cached[encoding], media_type="application/json", headers=headers)
+
+def changes_since(since: int):
+    """Changes after a sequence number, or None when the feed no longer reaches back that far"""
+    if since <= 0 or not change_feed or since > change_feed[-1][0]:
+        return None
+    if since < change_feed[0][0] - 1:
+        return None
+    
+    cycles = []
+    for seq, changes in reversed(change_feed):
+        if seq <= since:
+            break
+        cycles.append(changes)
+    return [change for changes in reversed(cycles) for change in changes]
+
+class Subscriber:
+    """A streaming client: its filters and a bounded queue of per-cycle messages"""
+    
+    def __init__(self, bookmakers=None, race=None, horse=None):
+        self.bookmakers = set(bookmakers) if bookmakers else None
+        self.race = race.lower() if race else None
+        self.horse = fold_name(horse) if horse else None
+        self.queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.delivered_seq = odds_data["update_count"]
+        self.resyncs = 0
+    
+    def wants(self, change: dict) -> bool:
+        if self.bookmakers is not None and change["bookmaker"] not in self.bookmakers:
+            return False
+        if self.race is not None and self.race not in change["race"].lower():
+            return False
+        if self.horse is not None and self.horse not in fold_name(change["horse"]):
+            return False
+        return True
+    
+    def push(self, message: dict):
+        """Queue a message; a full queue is discarded and replaced by a resync marker"""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.resyncs += 1
+            message = {"type": "resync", "seq": message["seq"], "since": self.delivered_seq}
+        self.queue.put_nowait(message)
+    
+    async def next_message(self):
+        """Next queued message, or None after a heartbeat interval with nothing to send"""
+        try:
+            message = await asyncio.wait_for(self.queue.get(), STREAM_HEARTBEAT)
+        except asyncio.TimeoutError:
+            return None
+        if message["type"] == "changes":
+            self.delivered_seq = message["seq"]
+        return message
+
+def publish_changes(seq: int, changes: list):
+    """Fan one cycle's changes out to every subscriber, filtered per subscriber"""
+    for subscriber in list(subscribers):
+        selected = [change for change in changes if subscriber.wants(change)]
+        if selected:
+            subscriber.push({"type": "changes", "seq": seq, "changes": selected})
+
+def subscribe(bookmakers=None, race=None, horse=None, last_seq=None) -> Subscriber:
+    """Register a subscriber, replaying missed changes when it is resuming"""
+    subscriber = Subscriber(bookmakers, race, horse)
+    if last_seq is not None:
+        missed = changes_since(last_seq)
+        if missed is None:
+            subscriber.push({"type": "resync", "seq": odds_data["update_count"], "since": last_seq})
+        else:
+            selected = [change for change in missed if subscriber.wants(change)]
+            if selected:
+                subscriber.push({"type": "changes", "seq": odds_data["update_count"], "changes": selected})
+    subscribers.add(subscriber)
+    return subscriber
+
+def apply_cycle(seq: int, now: float, changes: list, last_updated: str, markets: bool = True):
+    """Fold one cycle's changes into the feed, history and indexes"""
     odds_data.update({
-        "bet365": bet365_odds,
-        "william_hill": william_hill_odds,
-        "last_updated": datetime.now().isoformat(),
-        "update_count": odds_data["update_count"] + 1
+        "last_updated": last_updated,
+        "update_count": seq
     })
     
-    total = len(bet365_odds) + len(william_hill_odds)
+    change_feed.append((seq, changes))
+    for change in changes:
+        if change["odds"] is not None:
+            price_history.record(change["bookmaker"], change["race"], change["horse"], now, change["odds"])
+    price_history.flush()
+    
+    runner_matcher.apply(changes)
+    market_data.clear()
+    if markets:
+        market_data.update(compute_markets(runner_matcher.races, list(ADAPTERS)))
+    horse_index.rebuild(horse_id for store in odds_stores.values() for horse_id in store.horse_rows)
+    # Only bookmakers whose runners moved need fresh indexes
+    changed = {change["bookmaker"] for change in changes}
+    query_indexes.update(build_indexes(
+        {bookmaker: store for bookmaker, store in odds_stores.items() if bookmaker in changed or bookmaker not in query_indexes},
+        race_meta
+    ))
+
+def finish_cycle(seq: int, now: float, changes: list, last_updated: str, bodies: dict | None = None):
+    """Fold one cycle's changes into the feed, history, indexes and response bodies"""
+    apply_cycle(seq, now, changes, last_updated, markets=bodies is None)
+    if bodies is None:
+        render_responses()
+    else:
+        response_cache.update(bodies)
+    publish_changes(seq, changes)
+
+def seed_state(seq: int, changes: list, last_updated: str, bodies: dict | None = None):
+    """Take on a whole state that is not a cycle: a warm start or a new poller's first snapshot
+    
+    Nothing goes to the change feed, history or subscribers, so a client
+    resuming from an earlier sequence number gets a full snapshot instead.
+    """
+    change_feed.clear()
+    odds_data.update({
+        "last_updated": last_updated,
+        "update_count": seq
+    })
+    runner_matcher.apply(changes)
+    market_data.clear()
+    if bodies is None:
+        market_data.update(compute_markets(runner_matcher.races, list(ADAPTERS)))
+    horse_index.rebuild(horse_id for store in odds_stores.values() for horse_id in store.horse_rows)
+    query_indexes.update(build_indexes(odds_stores, race_meta))
+    if bodies is None:
+        render_responses()
+    else:
+        response_cache.update(bodies)
+
+def publish_snapshot(now: float):
+    """Write the current bodies and runner state for worker processes"""
+    state = {
+        "boot_id": BOOT_ID,
+        "cycle_time": now,
+        "last_updated": odds_data["last_updated"],
+        "runners": {
+            bookmaker: [[runner["race"], runner["horse"], runner["odds"]] for runner in store.runners()]
+            for bookmaker, store in odds_stores.items()
+        },
+        "sources": {
+            source: {key: value for key, value in state.items() if key != "payload_hash"}
+            for source, state in source_state.items()
+        },
+        "next_poll": poll_scheduler.next_poll,
+        "plans": poll_scheduler.plans,
+        "connection_stats": connection_stats
+    }
+    write_snapshot(SHARED_SNAPSHOT_PATH, odds_data["update_count"], response_cache, render_json(state))
+
+def apply_snapshot(version: int, bodies: dict, state: dict):
+    """Bring a worker up to a snapshot published by the poller"""
+    global BOOT_ID
+    restarted = state["boot_id"] != BOOT_ID
+    if restarted:
+        BOOT_ID = state["boot_id"]
+    
+    for source, shared in state["sources"].items():
+        if source in source_state:
+            source_state[source].update(shared)
+    for source, stats in state["connection_stats"].items():
+        connection_stats[source] = stats
+    poll_scheduler.next_poll.update(state["next_poll"])
+    poll_scheduler.plans.update(state["plans"])
+    
+    changes = []
+    for source, runners in state["runners"].items():
+        if source in odds_stores:
+            changes += odds_stores[source].update(runners, version, state["cycle_time"])
+    if restarted:
+        # First snapshot from this poller: its sequence numbers do not continue ours,
+        # so the diff against our stores is not a delta any client has asked for
+        seed_state(version, changes, state["last_updated"], bodies)
+        for subscriber in list(subscribers):
+            subscriber.push({"type": "resync", "seq": version, "since": subscriber.delivered_seq})
+    elif changes or version != odds_data["update_count"] or runner_matcher.resolve():
+        finish_cycle(version, state["cycle_time"], changes, state["last_updated"], bodies)
+
+def load_shared_snapshot() -> bool:
+    """Apply the poller's latest snapshot if it has moved on since the last check"""
+    snapshot = snapshot_reader.poll()
+    if snapshot is None:
+        return False
+    apply_snapshot(*snapshot)
+    return True
+
+async def snapshot_watcher():
+    """Background task for workers - picks up each snapshot the poller publishes"""
+    while updating:
+        try:
+            if load_shared_snapshot():
+                logger.info(f"📥 Snapshot #{odds_data['update_count']}: {sum(len(store) for store in odds_stores.values())} total WIN odds")
+        except Exception as e:
+            logger.error(f"❌ Snapshot load failed: {e!r}")
+        await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+def save_warm_start(now: float):
+    """Persist the live runners so the next boot can serve them straight away
+
+    The columns are copied here and written by a worker thread; while a write
+    is still running the cycle is skipped, the next one saves newer odds.
+    """
+    global warm_start_save
+    if warm_start_save is not None and not warm_start_save.done():
+        return
+    meta = {
+        "saved_at": now,
+        "update_count": odds_data["update_count"],
+        "last_updated": odds_data["last_updated"],
+        "sources": {
+            source: {key: state[key] for key in ("off_times", "tracks", "skipped", "last_success")}
+            for source, state in source_state.items()
+        }
+    }
+    warm_start_save = asyncio.create_task(write_warm_start_off_loop(snapshot_columns(odds_stores), meta))
+
+async def write_warm_start_off_loop(snapshot: dict, meta: dict):
+    try:
+        await asyncio.to_thread(write_warm_start, WARM_START_PATH, snapshot, meta)
+    except OSError as e:
+        logger.error(f"❌ Warm-start save failed: {e!r}")
+
+def load_warm_start() -> bool:
+    """Seed the stores from the last saved snapshot, marked stale until refreshed"""
+    started = time.perf_counter()
+    try:
+        meta, bookmakers = read_warm_start(WARM_START_PATH)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Warm-start load failed: {e!r}")
+        return False
+    
+    # Only today's card, and no older than a failing source's odds would be served
+    age = time.time() - meta["saved_at"]
+    if age > SNAPSHOT_MAX_AGE or datetime.fromtimestamp(meta["saved_at"], UK_TZ).date() != datetime.now(UK_TZ).date():
+        logger.info(f"🗑️ Warm start skipped: snapshot saved {age:.0f}s ago is too old")
+        return False
+    
+    for source, saved in meta["sources"].items():
+        if source in source_state:
+            source_state[source].update(saved, restored=True)
+    
+    # The last process may have served cycles it never saved; skip past them so a
+    # client's since=N from before the restart can never name a different cycle
+    seq = meta["update_count"] + CHANGE_FEED_CYCLES
+    changes = []
+    for source, (runners, changed_at) in bookmakers.items():
+        store = odds_stores.get(source)
+        if store is None:
+            continue
+        changes += store.update(runners, seq, meta["saved_at"])
+        for row, at in zip(store.order, changed_at):
+            store.changed_at[row] = at
+    
+    seed_state(seq, changes, meta["last_updated"])
+    
+    total = sum(len(store) for store in odds_stores.values())
+    logger.info(f"♻️ Warm start: {total} WIN odds saved {age:.0f}s ago, loaded in {(time.perf_counter() - started) * 1000:.1f}ms (stale until refreshed)")
+    return True
+
+async def update_odds(sources=None):
+    """Update odds from the given APIs (all of them by default)"""
+    global odds_data
+    
+    started = time.perf_counter()
+    sources = list(sources or ADAPTERS)
+    results = await asyncio.gather(*(fetch_bookmaker(ADAPTERS[source]) for source in sources))
+    
+    # Fetches for different sources overlap; applying them is one cycle at a time, in order
+    async with cycle_lock:
+        seq = odds_data["update_count"] + 1
+        now = time.time()
+        changes = []
+        for source, runners in zip(sources, results):
+            if runners is None:
+                # Unchanged or failed: keep serving the last good snapshot until it is too old
+                age = snapshot_age(source, now)
+                if len(odds_stores[source]) == 0 or age is None or age <= SNAPSHOT_MAX_AGE:
+                    continue
+                logger.error(f"🚨 {source}: no good data for {age:.0f}s, dropping stale odds")
+                runners = []
+            changes += odds_stores[source].update(runners, seq, now)
+        poll_scheduler.plan(sources, now)
+        
+        # Identical payloads everywhere: the sequence, bodies and ETags stay as they are,
+        # unless a race has only now been placed and its runners joined the markets
+        if changes or not response_cache or runner_matcher.resolve():
+            apply_cycle(seq, now, changes, datetime.now().isoformat())
+            await render_responses_off_loop()
+            publish_changes(seq, changes)
+            if odds_sink is not None:
+                odds_sink.submit(changes, now)
+            if any(runners is not None for runners in results):
+                save_warm_start(now)
+        if ODDS_ROLE == "poller":
+            # Published either way so workers see each source's latest fetch
+            publish_snapshot(now)
+        cycle_seconds.observe(value=time.perf_counter() - started)
+    
+    total = sum(len(store) for store in odds_stores.values())
     logger.info(f"🔄 Update #{odds_data['update_count']}: {total} total WIN odds")
 
+async def refresh_odds(sources):
+    """Update the given sources, sharing the fetch already in flight for any of them"""
+    wanted = set(sources)
+    flights = {refresh_flights[source] for source in wanted if source in refresh_flights}
+    missing = [source for source in ADAPTERS if source in wanted and source not in refresh_flights]
+    
+    if missing:
+        async def flight():
+            try:
+                await update_odds(missing)
+            finally:
+                # Cleared by the flight itself, before anyone awaiting it resumes
+                for source in missing:
+                    if refresh_flights.get(source) is task:
+                        del refresh_flights[source]
+        
+        task = asyncio.create_task(flight())
+        for source in missing:
+            refresh_flights[source] = task
+        flights.add(task)
+    # Shielded so a disconnecting client never cancels a fetch others are waiting on
+    await asyncio.shield(asyncio.gather(*flights))
+
+def stale_sources(sources, max_age: float, now: float) -> list:
+    ages = {source: snapshot_age(source, now) for source in sources}
+    return [source for source, age in ages.items() if age is None or age > max_age]
+
+async def ensure_fresh(sources, max_age: float | None):
+    """Refresh any of the sources older than max_age seconds before a request is answered"""
+    if max_age is None:
+        return
+    max_age = max(max_age, MAX_AGE_FLOOR)
+    stale = stale_sources(sources, max_age, time.time())
+    if not stale:
+        return
+    if ODDS_ROLE == "worker":
+        raise HTTPException(status_code=503, detail=f"Odds older than max_age={max_age:g}s for {', '.join(stale)}; workers cannot refresh on demand")
+    
+    try:
+        await refresh_odds(stale)
+    except Exception as e:
+        logger.error(f"❌ On-demand refresh failed: {e!r}")
+    stale = stale_sources(stale, max_age, time.time())
+    if stale:
+        raise HTTPException(status_code=503, detail=f"Could not refresh {', '.join(stale)} within max_age={max_age:g}s")
+
 async def odds_updater():
-    """Background task - updates every 5 seconds during racing hours"""
+    """Background task - polls each source when the scheduler says it is due"""
     global updating
     updating = True
     
-    logger.info("🚀 Starting WIN odds updater (7AM-9PM UTC)...")
+    logger.info("🚀 Starting WIN odds updater (adaptive to race offs, 7AM-9PM UTC)...")
     
     while updating:
         try:
-            if is_racing_hours():
-                await update_odds()
-                await asyncio.sleep(5)
-            else:
+            if not is_racing_hours():
                 await asyncio.sleep(300)  # 5 minutes outside racing hours
+                continue
+            due = poll_scheduler.due(time.time())
+            if due:
+                await refresh_odds(due)
+            await asyncio.sleep(poll_scheduler.sleep_time(time.time()))
         except Exception as e:
             logger.error(f"❌ Updater error: {e}")
             await asyncio.sleep(5)
 
+async def event_loop_monitor():
+    """Background task - measures how late the event loop wakes a sleeping timer"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_PROBE_INTERVAL)
+        lag = max(time.perf_counter() - started - EVENT_LOOP_PROBE_INTERVAL, 0.0)
+        loop_lag_seconds.observe(value=lag)
+        loop_lag_latest.set(value=lag)
+
 @app.on_event("startup")
 async def startup():
-    """Start background updater"""
-    await update_odds()
+    """Start background updater (or the snapshot watcher in worker processes)"""
+    global updating, odds_sink
+    asyncio.create_task(event_loop_monitor())
+    if ODDS_ROLE == "worker":
+        updating = True
+        if not load_shared_snapshot():
+            logger.warning(f"⏳ No snapshot at {SHARED_SNAPSHOT_PATH} yet - waiting for the poller")
+        asyncio.create_task(snapshot_watcher())
+        logger.info("✅ Fast WIN Odds API worker started!")
+        return
+    
+    for source in connection_stats:
+        get_http_client(source)
+    
+    if DB_SINK_URL:
+        odds_sink = OddsSink(create_backend(DB_SINK_URL), race_info, DB_SINK_BATCH_SIZE, DB_SINK_MAX_PENDING, DB_SINK_INTERVAL)
+        odds_sink.start()
+    
+    if load_warm_start():
+        # Serve the saved snapshot now and refresh every source straight away, racing hours or not
+        if ODDS_ROLE == "poller":
+            publish_snapshot(time.time())
+        asyncio.create_task(refresh_odds(list(ADAPTERS)))
+    else:
+        await update_odds()
     asyncio.create_task(odds_updater())
     logger.info("✅ Fast WIN Odds API started!")
 
 @app.on_event("shutdown") 
 async def shutdown():
-    """Stop updater"""
+    """Stop updater and close upstream connections"""
     global updating
     updating = False
+    await close_http_clients()
+    if odds_sink is not None:
+        await odds_sink.close()
+    if warm_start_save is not None:
+        await warm_start_save
+    if parse_executor is not None:
+        parse_executor.shutdown(wait=False, cancel_futures=True)
+    price_history.close()
 
 @app.get("/")
 async def root():
     """API status"""
     uk_time = datetime.now(timezone.utc)
     racing_active = is_racing_hours()
+    now = time.time()
+    
+    bookmakers = {}
+    for source, store in odds_stores.items():
+        state = source_state[source]
+        age = snapshot_age(source, now)
+        bookmakers[source] = {
+            "horses": len(store),
+            "circuit": state["circuit"],
+            "failures": state["failures"],
+            "skipped_runners": state["skipped"],
+            "snapshot_age": None if age is None else round(age, 1),
+            "stale": state["failures"] > 0 or state["restored"],
+            "warm_start": state["restored"]
+        }
     
     return {
         "service": "Fast WIN Odds API",
+        "role": ODDS_ROLE,
         "status": "running" if racing_active else "sleeping",
         "racing_hours": "07:00-21:00 UTC",
         "current_time_utc": uk_time.strftime("%H:%M"),
-        "total_horses": len(odds_data["bet365"]) + len(odds_data["william_hill"]),
-        "bet365_horses": len(odds_data["bet365"]),
-        "william_hill_horses": len(odds_data["william_hill"]),
+        "total_horses": sum(len(store) for store in odds_stores.values()),
+        "bet365_horses": len(odds_stores["bet365"]),
+        "william_hill_horses": len(odds_stores["william_hill"]),
         "last_updated": odds_data["last_updated"],
-        "update_count": odds_data["update_count"]
+        "last_checked": last_checked(),
+        "update_count": odds_data["update_count"],
+        "bookmakers": bookmakers,
+        "stream_subscribers": len(subscribers),
+        "upstream_connections": connection_stats
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: fetch, parse, staleness, routes and event-loop lag"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/schedule")
+async def get_schedule():
+    """Current adaptive polling plan per source"""
+    return poll_scheduler.snapshot(time.time())
+
+def parse_since(value: str) -> float:
+    """Unix time from epoch seconds or an ISO timestamp (UTC unless it says otherwise)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        since = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid updated_since: {value}")
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since.timestamp()
+
 @app.get("/odds")
-async def get_all_odds():
-    """Get all WIN odds from both bookmakers"""
-    all_odds = odds_data["bet365"] + odds_data["william_hill"]
-    return {
-        "horses": all_odds,
-        "total": len(all_odds),
-        "bet365_count": len(odds_data["bet365"]),
-        "william_hill_count": len(odds_data["william_hill"]),
-        "last_updated": odds_data["last_updated"]
-    }
+async def get_all_odds(
+    request: Request,
+    bookmaker: list[str] | None = Query(None),
+    race: str | None = None,
+    track: str | None = None,
+    min_odds: float | None = None,
+    max_odds: float | None = None,
+    updated_since: str | None = None,
+    fields: str | None = None,
+    limit: int = Query(500, ge=1),
+    cursor: str | None = None,
+    max_age: float | None = Query(None, ge=0)
+):
+    """Get all WIN odds from both bookmakers, or a filtered, projected page of them"""
+    await ensure_fresh([name for name in bookmaker if name in odds_stores] if bookmaker else odds_stores, max_age)
+    if ODDS_QUERY_PARAMS.isdisjoint(request.query_params):
+        return cached_response(request, "odds")
+    
+    selected_fields = DEFAULT_FIELDS
+    if fields:
+        selected_fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected_fields if field not in FIELD_VALUES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)} (choose from {', '.join(FIELD_VALUES)})")
+    if bookmaker:
+        unknown = [name for name in bookmaker if name not in odds_stores]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Unknown bookmaker: {', '.join(unknown)}")
+    
+    filters = QueryFilters(race, track, min_odds, max_odds, parse_since(updated_since) if updated_since else None)
+    try:
+        horses, next_cursor = run_query(
+            query_indexes, set(bookmaker) if bookmaker else None, filters,
+            selected_fields, min(limit, ODDS_QUERY_MAX_LIMIT), cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return Response(
+        content=render_json({
+            "horses": horses,
+            "count": len(horses),
+            "next_cursor": next_cursor,
+            "seq": odds_data["update_count"],
+            "last_updated": odds_data["last_updated"],
+            "last_checked": last_checked()
+        }),
+        media_type="application/json"
+    )
+
+@app.get("/odds/changes")
+async def get_odds_changes(since: int = 0):
+    """Runner changes after sequence `since`, or a full snapshot when too far behind"""
+    seq = odds_data["update_count"]
+    changes = changes_since(since)
+    
+    if changes is None:
+        all_odds = all_runners()
+        return FastJSONResponse({
+            "seq": seq,
+            "since": since,
+            "boot_id": BOOT_ID,
+            "full": True,
+            "horses": all_odds,
+            "total": len(all_odds),
+            "last_updated": odds_data["last_updated"],
+            "last_checked": last_checked()
+        })
+    
+    return FastJSONResponse({
+        "seq": seq,
+        "since": since,
+        "boot_id": BOOT_ID,
+        "full": False,
+        "changes": changes,
+        "total": len(changes),
+        "last_updated": odds_data["last_updated"],
+        "last_checked": last_checked()
+    })
+
+@app.get("/stream")
+async def stream_changes(
+    request: Request,
+    bookmaker: list[str] | None = Query(None),
+    race: str | None = None,
+    horse: str | None = None
+):
+    """Server-Sent Events stream of price changes, pushed after every update"""
+    last_event_id = request.headers.get("last-event-id")
+    last_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscriber = subscribe(bookmaker, race, horse, last_seq)
+    
+    async def events():
+        try:
+            yield f"retry: 5000\nevent: hello\ndata: {render_json({'seq': odds_data['update_count'], 'boot_id': BOOT_ID}).decode()}\n\n"
+            while not await request.is_disconnected():
+                message = await subscriber.next_message()
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {message['seq']}\nevent: {message['type']}\ndata: {render_json(message).decode()}\n\n"
+        finally:
+            subscribers.discard(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws")
+async def websocket_changes(
+    websocket: WebSocket,
+    bookmaker: list[str] | None = Query(None),
+    race: str | None = None,
+    horse: str | None = None,
+    since: int | None = None
+):
+    """WebSocket stream of price changes, pushed after every update"""
+    await websocket.accept()
+    subscriber = subscribe(bookmaker, race, horse, since)
+    
+    try:
+        await websocket.send_json({"type": "hello", "seq": odds_data["update_count"], "boot_id": BOOT_ID})
+        while True:
+            message = await subscriber.next_message()
+            if message is None:
+                message = {"type": "heartbeat", "seq": odds_data["update_count"]}
+            # A client that cannot drain its socket is dropped rather than buffered
+            await asyncio.wait_for(websocket.send_json(message), STREAM_SEND_TIMEOUT)
+    except (WebSocketDisconnect, asyncio.TimeoutError, OSError, RuntimeError):
+        pass
+    finally:
+        subscribers.discard(subscriber)
 
 @app.get("/bet365")
-async def get_bet365():
+async def get_bet365(request: Request, max_age: float | None = Query(None, ge=0)):
     """Get Bet365 WIN odds only"""
-    return {
-        "horses": odds_data["bet365"],
-        "count": len(odds_data["bet365"]),
-        "last_updated": odds_data["last_updated"]
-    }
+    await ensure_fresh(["bet365"], max_age)
+    return cached_response(request, "bet365")
 
 @app.get("/william-hill")
-async def get_william_hill():
+async def get_william_hill(request: Request, max_age: float | None = Query(None, ge=0)):
     """Get William Hill WIN odds only"""
-    return {
-        "horses": odds_data["william_hill"],
-        "count": len(odds_data["william_hill"]),
-        "last_updated": odds_data["last_updated"]
-    }
+    await ensure_fresh(["william_hill"], max_age)
+    return cached_response(request, "william_hill")
+
+@app.get("/bookmakers/{bookmaker}")
+async def get_bookmaker(request: Request, bookmaker: str, max_age: float | None = Query(None, ge=0)):
+    """Get WIN odds for any registered bookmaker"""
+    if bookmaker not in odds_stores:
+        raise HTTPException(status_code=404, detail=f"Unknown bookmaker: {bookmaker}")
+    await ensure_fresh([bookmaker], max_age)
+    return cached_response(request, bookmaker)
+
+@app.get("/races")
+async def get_races():
+    """Races matched across bookmakers by track and off time"""
+    races = runner_matcher.summary()
+    return FastJSONResponse({
+        "races": races,
+        "count": len(races)
+    })
+
+@app.get("/race/{race_id}/best-odds")
+async def get_best_odds(race_id: str, max_age: float | None = Query(None, ge=0)):
+    """Best price per runner in a race, who holds it and each bookmaker's price"""
+    await ensure_fresh(odds_stores, max_age)
+    best = runner_matcher.best_odds(race_id, list(ADAPTERS))
+    if best is None:
+        raise HTTPException(status_code=404, detail=f"Unknown race: {race_id}")
+    return FastJSONResponse(best)
+
+@app.get("/markets")
+async def get_markets(request: Request, race_id: str | None = None, max_age: float | None = Query(None, ge=0)):
+    """Implied probabilities, book % and consensus prices per matched race"""
+    await ensure_fresh(odds_stores, max_age)
+    if race_id is None:
+        return cached_response(request, "markets")
+    
+    if not market_data and ODDS_ROLE == "worker" and "markets" in response_cache:
+        # Workers only hold the rendered body; parse it on first use per snapshot
+        markets = json.loads(bytes(response_cache["markets"]["identity"]))["markets"]
+        market_data.update((market["race_id"], market) for market in markets)
+    
+    market = market_data.get(race_id)
+    if market is None:
+        raise HTTPException(status_code=404, detail=f"Unknown race: {race_id}")
+    return FastJSONResponse(market)
 
 @app.get("/horse/{horse_name}")
-async def find_horse(horse_name: str):
+async def find_horse(
+    horse_name: str,
+    match: Literal["exact", "prefix", "substring"] = "substring",
+    max_age: float | None = Query(None, ge=0)
+):
     """Find a specific horse across both bookmakers"""
-    all_odds = odds_data["bet365"] + odds_data["william_hill"]
-    matching = [horse for horse in all_odds if horse_name.lower() in horse["horse"].lower()]
+    await ensure_fresh(odds_stores, max_age)
+    matching = [
+        store.runner(row)
+        for name in horse_index.search(horse_name, match)
+        for horse_id in sorted(horse_index.horse_ids[name])
+        for store in odds_stores.values()
+        for row in store.horse_rows.get(horse_id, ())
+    ]
     
-    return {
+    by_bookmaker = {"bet365": [], "william_hill": []}
+    for runner in matching:
+        by_bookmaker.setdefault(runner["bookmaker"], []).append(runner)
+    
+    return FastJSONResponse({
         "query": horse_name,
+        "match": match,
         "matches": matching,
+        "bookmakers": by_bookmaker,
         "count": len(matching)
-    }
+    })
+
+@app.get("/horse/{horse_name}/history")
+async def horse_history(horse_name: str, bookmaker: str | None = None, race: str | None = None):
+    """Price movements for a horse, served from the in-process history store"""
+    series = []
+    for series_bookmaker, series_race, series_horse, points in price_history.series(horse_name):
+        if bookmaker and series_bookmaker != bookmaker:
+            continue
+        if race and race.lower() not in series_race.lower():
+            continue
+        series.append({
+            "bookmaker": series_bookmaker,
+            "race": series_race,
+            "horse": series_horse,
+            "points": [
+                {"time": datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), "odds": price}
+                for timestamp, price in points
+            ]
+        })
+    
+    return FastJSONResponse({
+        "query": horse_name,
+        "series": series,
+        "count": len(series)
+    })
+
+async def run_poller():
+    """Headless poller for split mode: polls upstream and publishes snapshots only"""
+    await startup()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await shutdown()
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    if ODDS_ROLE == "poller" and "--serve" not in sys.argv:
+        asyncio.run(run_poller())
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Per-race market analytics for the Fast Odds API
+
+All matched runners are laid out as one runners x bookmakers price matrix so
+implied probabilities, book percentages, the consensus price and each
+bookmaker's deviation from it come out of a handful of NumPy operations per
+cycle rather than a loop per row.
+"""
+
+import math
+from datetime import datetime
+
+import numpy as np
+
+from bookmakers import UK_TZ
+
+def compute_markets(races: dict, bookmakers: list) -> dict:
+    """Market metrics keyed by canonical race id, from the runner match table"""
+    column = {bookmaker: index for index, bookmaker in enumerate(bookmakers)}
+    race_ids = list(races)
+    race_of_row = []
+    runner_keys = []
+    price_rows = []
+
+    for race_index, race_id in enumerate(race_ids):
+        for folded, runner in races[race_id]["runners"].items():
+            if not runner["prices"]:
+                continue
+            row = [np.nan] * len(bookmakers)
+            for bookmaker, price in runner["prices"].items():
+                row[column[bookmaker]] = price
+            price_rows.append(row)
+            race_of_row.append(race_index)
+            runner_keys.append((folded, runner["horse"]))
+
+    if not price_rows:
+        return {}
+
+    prices = np.array(price_rows, dtype=float)
+    race_index = np.array(race_of_row, dtype=np.intp)
+    quoted = ~np.isnan(prices)
+
+    # Implied probability of every quote, and each bookmaker's book % per race
+    with np.errstate(divide="ignore", invalid="ignore"):
+        implied = np.where(quoted & (prices > 0), 1.0 / prices, np.nan)
+    filled = np.nan_to_num(implied)
+    books = np.stack([
+        np.bincount(race_index, weights=filled[:, index], minlength=len(race_ids))
+        for index in range(len(bookmakers))
+    ], axis=1)
+    books[books == 0] = np.nan
+
+    # Consensus: mean of the margin-free probabilities across bookmakers quoting the runner
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fair = implied / books[race_index]
+        consensus_probability = np.nanmean(np.where(quoted, fair, np.nan), axis=1)
+        consensus_odds = 1.0 / consensus_probability
+        deviation = prices / consensus_odds[:, None] - 1.0
+
+    # Round in bulk; every quoted cell and every runner's consensus is finite from here on
+    prices_list = prices.tolist()
+    implied_list = np.round(implied, 4).tolist()
+    deviation_list = np.round(deviation, 4).tolist()
+    books_list = np.round(books * 100, 2).tolist()
+    consensus_probability_list = np.round(consensus_probability, 4).tolist()
+    consensus_odds_list = np.round(consensus_odds, 2).tolist()
+
+    markets = {}
+    for index, race_id in enumerate(race_ids):
+        race = races[race_id]
+        markets[race_id] = {
+            "race_id": race_id,
+            "track": race["track"],
+            "off_time": datetime.fromtimestamp(race["off_time"], UK_TZ).isoformat(),
+            "book_percentage": {
+                bookmaker: books_list[index][column[bookmaker]]
+                for bookmaker in bookmakers
+                if not math.isnan(books_list[index][column[bookmaker]])
+            },
+            "runners": []
+        }
+
+    for row, (folded, horse) in enumerate(runner_keys):
+        race_id = race_ids[race_of_row[row]]
+        markets[race_id]["runners"].append({
+            "runner_id": f"{race_id}/{folded}",
+            "horse": horse,
+            "consensus_odds": consensus_odds_list[row],
+            "consensus_probability": consensus_probability_list[row],
+            "bookmakers": {
+                bookmaker: {
+                    "odds": prices_list[row][index],
+                    "implied_probability": implied_list[row][index],
+                    "deviation": deviation_list[row][index]
+                }
+                for bookmaker, index in column.items()
+                if not math.isnan(prices_list[row][index])
+            }
+        })
+
+    for market in markets.values():
+        market["runners"].sort(key=lambda runner: runner["consensus_odds"])
+    return markets
@@ -0,0 +1,158 @@
+"""
+Cross-bookmaker runner matching for the Fast Odds API
+
+Bookmakers label races differently ("Race 3 - Ascot" vs "14:30 Ascot"), so
+races are keyed by a canonical id built from the normalized track name and
+the UK off time, and runners by that id plus the folded horse name. Ids are
+worked out once per new runner and kept until the runner leaves.
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from bookmakers import UK_TZ
+from odds_store import fold_name
+
+@lru_cache(maxsize=4096)
+def normalize_track(track: str) -> str:
+    """Track slug tolerant of "(AW)" suffixes, "City" and punctuation"""
+    track = re.sub(r"\([^)]*\)", " ", track.lower())
+    track = re.sub(r"\bcity\b", " ", track)
+    return re.sub(r"[\W_]+", "", track)
+
+def canonical_race_id(track: str, off_time) -> str | None:
+    """e.g. "ascot-1430", or None when the race cannot be placed"""
+    slug = normalize_track(track or "")
+    if not slug or off_time is None:
+        return None
+    return f"{slug}-{datetime.fromtimestamp(off_time, UK_TZ):%H%M}"
+
+class RunnerMatcher:
+    """Match table from bookmaker runners to canonical race and runner ids"""
+
+    def __init__(self, race_info):
+        self.race_info = race_info  # (bookmaker, race) -> (track, off_time)
+        self.race_ids = {}          # (bookmaker, race) -> (canonical race id, track, off time)
+        self.keys = {}              # (bookmaker, race, horse) -> (race_id, folded horse)
+        self.races = {}             # race_id -> {"track", "off_time", "labels", "runners"}
+        self.unresolved = {}        # (bookmaker, race) -> {horse: odds} for races not placed yet
+
+    def race_id(self, bookmaker: str, race: str):
+        key = (bookmaker, race)
+        cached = self.race_ids.get(key)
+        if cached is None:
+            track, off_time = self.race_info(bookmaker, race)
+            cached = (canonical_race_id(track, off_time), track, off_time)
+            if cached[0] is None:
+                return None  # not cached: the track or off time may turn up in a later payload
+            self.race_ids[key] = cached
+
+        race_id, track, off_time = cached
+        if race_id not in self.races:
+            self.races[race_id] = {"track": track, "off_time": off_time, "labels": {}, "runners": {}}
+        return race_id
+
+    def apply(self, changes):
+        """Fold one cycle's changes into the match table"""
+        for change in changes:
+            bookmaker, race, horse = change["bookmaker"], change["race"], change["horse"]
+            key = (bookmaker, race, horse)
+
+            if change["odds"] is None:
+                matched = self.keys.pop(key, None)
+                if matched is not None:
+                    self._remove(bookmaker, *matched)
+                waiting = self.unresolved.get((bookmaker, race))
+                if waiting is not None:
+                    waiting.pop(horse, None)
+                    if not waiting:
+                        del self.unresolved[(bookmaker, race)]
+                continue
+
+            self._add(bookmaker, race, horse, change["odds"])
+        self.resolve()
+
+    def resolve(self) -> bool:
+        """Match runners of races that have since gained a track or off time; True if any did"""
+        resolved = False
+        for (bookmaker, race), waiting in list(self.unresolved.items()):
+            if self.race_id(bookmaker, race) is not None:
+                del self.unresolved[(bookmaker, race)]
+                for horse, odds in waiting.items():
+                    self._add(bookmaker, race, horse, odds)
+                resolved = True
+        return resolved
+
+    def _add(self, bookmaker: str, race: str, horse: str, odds: float):
+        key = (bookmaker, race, horse)
+        matched = self.keys.get(key)
+        if matched is None:
+            race_id = self.race_id(bookmaker, race)
+            if race_id is None:
+                self.unresolved.setdefault((bookmaker, race), {})[horse] = odds
+                return
+            matched = self.keys[key] = (race_id, fold_name(horse))
+            self.races[race_id]["labels"][bookmaker] = race
+
+        race_id, folded = matched
+        runner = self.races[race_id]["runners"].setdefault(folded, {"horse": horse, "prices": {}})
+        runner["prices"][bookmaker] = odds
+
+    def _remove(self, bookmaker: str, race_id: str, folded: str):
+        race = self.races.get(race_id)
+        if race is None:
+            return
+        runner = race["runners"].get(folded)
+        if runner is not None:
+            runner["prices"].pop(bookmaker, None)
+            if not runner["prices"]:
+                del race["runners"][folded]
+        if not race["runners"]:
+            del self.races[race_id]
+            for label_bookmaker, label in race["labels"].items():
+                self.race_ids.pop((label_bookmaker, label), None)
+
+    def best_odds(self, race_id: str, bookmaker_order) -> dict | None:
+        """Best price per runner in a race, which bookmaker holds it and every price"""
+        race = self.races.get(race_id)
+        if race is None:
+            return None
+
+        runners = []
+        for folded, runner in race["runners"].items():
+            prices = runner["prices"]
+            best_bookmaker = max(
+                (bookmaker for bookmaker in bookmaker_order if bookmaker in prices),
+                key=lambda bookmaker: prices[bookmaker]
+            )
+            runners.append({
+                "runner_id": f"{race_id}/{folded}",
+                "horse": runner["horse"],
+                "best_odds": prices[best_bookmaker],
+                "best_bookmaker": best_bookmaker,
+                "prices": dict(prices)
+            })
+        runners.sort(key=lambda runner: runner["best_odds"])
+
+        return {
+            "race_id": race_id,
+            "track": race["track"],
+            "off_time": datetime.fromtimestamp(race["off_time"], UK_TZ).isoformat(),
+            "bookmaker_races": dict(race["labels"]),
+            "runners": runners,
+            "count": len(runners)
+        }
+
+    def summary(self) -> list:
+        """Every matched race with its bookmakers and runner count"""
+        return [
+            {
+                "race_id": race_id,
+                "track": race["track"],
+                "off_time": datetime.fromtimestamp(race["off_time"], UK_TZ).isoformat(),
+                "bookmakers": sorted(race["labels"]),
+                "runners": len(race["runners"])
+            }
+            for race_id, race in sorted(self.races.items(), key=lambda item: item[1]["off_time"])
+        ]
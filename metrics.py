@@ -0,0 +1,174 @@
+"""
+Prometheus metrics for the Fast Odds API
+
+A small in-process registry of counters, histograms and scrape-time gauges,
+rendered in the Prometheus text exposition format by /metrics, plus the
+ASGI middleware that times every HTTP route.
+"""
+
+import bisect
+import math
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROCESSING_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(9))  # 1KB .. 64MB
+
+registry = []
+
+def format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A named metric with a fixed set of label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        registry.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+class Gauge(Metric):
+    """Gauge whose values are collected at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels=(), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect  # () -> {label values tuple: value}
+        self.values = {}
+
+    def set(self, *label_values, value: float):
+        self.values[label_values] = value
+
+    def render(self) -> list:
+        values = self.collect() if self.collect is not None else self.values
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+            for key, value in values.items()
+            if value is not None
+        ]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, *label_values, value: float):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list:
+        lines = self.header()
+        for key, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+def render_metrics() -> bytes:
+    """Every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in registry:
+        lines += metric.render()
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+# HTTP metrics, recorded by MetricsMiddleware
+http_request_seconds = Histogram(
+    "fast_odds_http_request_duration_seconds",
+    "Time from request to response headers, by route",
+    ("method", "route", "status")
+)
+http_response_bytes = Histogram(
+    "fast_odds_http_response_size_bytes",
+    "Response body size as sent, by route",
+    ("method", "route"),
+    SIZE_BUCKETS
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests per route template
+
+    Latency runs to the response headers so long-lived streams do not skew
+    it; the size covers every body chunk sent.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+        self.route_paths = {}
+
+    def route_path(self, endpoint) -> str:
+        if endpoint is None:
+            return "unmatched"
+        path = self.route_paths.get(endpoint)
+        if path is None:
+            path = next((route.path for route in self.routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+            self.route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                http_request_seconds.observe(
+                    scope["method"], self.route_path(scope.get("endpoint")), str(message["status"]),
+                    value=time.perf_counter() - started
+                )
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_response_bytes.observe(scope["method"], self.route_path(scope.get("endpoint")), value=size)
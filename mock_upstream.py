@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Bet365 / William Hill upstream
+
+Serves recorded payloads (the *_raw_*.json files compare_apis.py saves) or
+synthetic ones, scaled up by cloning races, with configurable latency,
+error rate and price churn between requests. Point the API at it with
+UPSTREAM_BASE_URL=http://127.0.0.1:<port>.
+
+    python mock_upstream.py --scale 10 --latency 50 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import copy
+import glob
+import json
+import os
+import random
+from fastapi import FastAPI, Response
+from bookmakers import ADAPTERS
+
+TRACKS = ["Ascot", "Kempton", "Newcastle", "Wolverhampton", "Lingfield", "Doncaster", "Haydock", "Sandown", "York", "Chelmsford City"]
+FRACTIONS = ["1/5", "2/7", "1/2", "4/6", "10/11", "Evs", "6/5", "6/4", "7/4", "2/1", "5/2", "3/1", "4/1", "5/1", "6/1", "8/1", "10/1", "12/1", "16/1", "20/1", "33/1", "50/1"]
+
+def fraction_to_decimal(fraction: str) -> float:
+    if fraction == "Evs":
+        return 2.0
+    numerator, denominator = fraction.split("/")
+    return round(float(numerator) / float(denominator) + 1, 2)
+
+def synthetic_card(races: int, runners: int, seed: int = 1) -> list:
+    """(track, "HH:MM", horse names) for a made-up day's racing"""
+    rng = random.Random(seed)
+    card = []
+    for index in range(races):
+        track = TRACKS[index % len(TRACKS)]
+        off = f"{13 + index // 12 % 9:02d}:{index % 12 * 5:02d}"
+        horses = [f"Horse {index}-{runner} {rng.choice(['Star', 'Dancer', 'Flyer', 'Queen', 'King'])}" for runner in range(runners)]
+        card.append((track, off, horses))
+    return card
+
+def synthetic_bet365(card: list, rng: random.Random) -> dict:
+    return {
+        "races": [
+            {
+                "league": track,
+                "raceNum": index // len(TRACKS) + 1,
+                "time": off,
+                "horses": [{"na": horse, "OD": rng.choice(FRACTIONS).replace("Evs", "1/1")} for horse in horses]
+            }
+            for index, (track, off, horses) in enumerate(card)
+        ]
+    }
+
+def synthetic_william_hill(card: list, rng: random.Random) -> dict:
+    races = []
+    for track, off, horses in card:
+        horse_entries = []
+        for horse in horses:
+            fraction = rng.choice(FRACTIONS)
+            horse_entries.append({
+                "name": horse,
+                "active": True,
+                "EW": {"fractional": fraction, "decimal": fraction_to_decimal(fraction)}
+            })
+        races.append({"name": f"{off} {track}", "settled": False, "horses": horse_entries})
+    return {"races": races}
+
+SYNTHETIC = {"bet365": synthetic_bet365, "william_hill": synthetic_william_hill}
+
+def scale_payload(data: dict, scale: int) -> dict:
+    """Clone every race `scale` times, renaming the copies so they stay distinct"""
+    races = data.get("races", [])
+    scaled = list(races)
+    for copy_number in range(2, scale + 1):
+        for race in races:
+            clone = copy.deepcopy(race)
+            for key in ("league", "name"):
+                if key in clone:
+                    clone[key] = f"{clone[key]} {copy_number}"
+            scaled.append(clone)
+    return {**data, "races": scaled}
+
+def churn_prices(data: dict, fraction: float, rng: random.Random) -> dict:
+    """A copy of the payload with roughly `fraction` of prices moved"""
+    data = copy.deepcopy(data)
+    for race in data.get("races", []):
+        for horse in race.get("horses", []):
+            if rng.random() >= fraction:
+                continue
+            new_fraction = rng.choice(FRACTIONS).replace("Evs", "1/1")
+            if "OD" in horse:
+                horse["OD"] = new_fraction
+            elif isinstance(horse.get("EW"), dict):
+                horse["EW"] = {"fractional": new_fraction, "decimal": fraction_to_decimal(new_fraction)}
+    return data
+
+def latest_recording(directory: str, bookmaker: str):
+    paths = sorted(glob.glob(os.path.join(directory, f"{bookmaker}_raw_*.json")), key=os.path.getmtime)
+    return paths[-1] if paths else None
+
+def build_payloads(scale: int = 1, churn: float = 0.1, variants: int = 8, recorded: str | None = None,
+                   races: int = 60, runners: int = 12, seed: int = 1) -> dict:
+    """Pre-encoded payload variants per bookmaker, served in rotation"""
+    rng = random.Random(seed)
+    card = synthetic_card(races, runners, seed)
+    payloads = {}
+    for name in ADAPTERS:
+        path = latest_recording(recorded, name) if recorded else None
+        if path is not None:
+            with open(path) as f:
+                base = json.load(f)
+        elif name in SYNTHETIC:
+            base = SYNTHETIC[name](card, rng)
+        else:
+            base = {"races": []}
+        base = scale_payload(base, scale)
+        payloads[name] = [
+            json.dumps(base if variant == 0 else churn_prices(base, churn, rng), separators=(",", ":")).encode()
+            for variant in range(variants)
+        ]
+    return payloads
+
+def create_app(payloads: dict, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0) -> FastAPI:
+    """Mock upstream serving each bookmaker's variants at its adapter path"""
+    app = FastAPI(title="Mock odds upstream")
+    served = {name: 0 for name in payloads}
+
+    def route(name: str):
+        async def serve():
+            delay = latency + random.uniform(0, jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            if random.random() < error_rate:
+                return Response(content=b'{"error":"mock upstream failure"}', status_code=503, media_type="application/json")
+            variants = payloads[name]
+            body = variants[served[name] % len(variants)]
+            served[name] += 1
+            return Response(content=body, media_type="application/json")
+        return serve
+
+    for name, adapter in ADAPTERS.items():
+        if name in payloads:
+            app.add_api_route(adapter.path, route(name), methods=["GET"])
+    return app
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic bookmaker payloads locally")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--scale", type=int, default=1, help="clone every race this many times")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency up to this many ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--churn", type=float, default=0.1, help="fraction of prices moved between variants")
+    parser.add_argument("--variants", type=int, default=8, help="payload variants served in rotation")
+    parser.add_argument("--recorded", help="directory holding <bookmaker>_raw_*.json recordings")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    import uvicorn
+    args = parse_args()
+    payloads = build_payloads(args.scale, args.churn, args.variants, args.recorded)
+    for name, variants in payloads.items():
+        print(f"📦 {name}: {len(variants)} variants, {len(variants[0]) / 1024:.0f} KB each")
+    app = create_app(payloads, args.latency / 1000, args.jitter / 1000, args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
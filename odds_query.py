@@ -0,0 +1,183 @@
+"""
+Indexed odds queries for the Fast Odds API
+
+Each bookmaker's live rows are indexed by race label, canonical race id,
+track, price and time of last change at the end of every cycle, so a
+filtered /odds request starts from the smallest matching slice instead of
+scanning every runner. Pages are ordered by (bookmaker, race, horse) and the
+cursor is the last key returned, so it stays valid across updates.
+"""
+
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+from matching import normalize_track
+from odds_store import horse_names, race_names
+
+DEFAULT_FIELDS = ("horse", "race", "odds", "bookmaker")
+
+class QueryFilters:
+    """The row filters of one odds query; None means no constraint"""
+
+    def __init__(self, race=None, track=None, min_odds=None, max_odds=None, updated_since=None):
+        self.race = race
+        self.race_label = race.lower() if race else None
+        self.track = normalize_track(track) if track else None
+        self.min_odds = min_odds
+        self.max_odds = max_odds
+        self.updated_since = updated_since
+
+class BookmakerIndex:
+    """Query indexes over one bookmaker's live rows"""
+
+    def __init__(self, store, race_meta):
+        self.store = store
+        races, horses = race_names.names, horse_names.names
+        race_ids, horse_ids = store.race_ids, store.horse_ids
+
+        # Page order: rows sorted by (race, horse), with each row's rank in it
+        self.rows = sorted(store.order, key=lambda row: (races[race_ids[row]], horses[horse_ids[row]]))
+        self.rank = dict(zip(self.rows, range(len(self.rows))))
+
+        rows_by_race = {}
+        for row in self.rows:
+            rows_by_race.setdefault(race_ids[row], []).append(row)
+
+        self.races = {}      # race name id -> (canonical race id or None, track or None, normalized track)
+        self.by_race = {}    # lowercased race label -> rows
+        self.by_race_id = {}
+        self.by_track = {}   # normalized track -> rows
+        for race_name_id, rows in rows_by_race.items():
+            race = races[race_name_id]
+            race_id, track = race_meta(store.bookmaker, race)
+            track_key = normalize_track(track or "")
+            self.races[race_name_id] = (race_id, track, track_key)
+            self.by_race.setdefault(race.lower(), []).extend(rows)
+            if race_id is not None:
+                self.by_race_id.setdefault(race_id, []).extend(rows)
+            if track_key:
+                self.by_track.setdefault(track_key, []).extend(rows)
+
+        prices, changed_at = store.prices, store.changed_at
+        self.by_price = sorted(self.rows, key=prices.__getitem__)
+        self.price_values = [prices[row] for row in self.by_price]
+        self.by_change = sorted(self.rows, key=changed_at.__getitem__)
+        self.change_values = [changed_at[row] for row in self.by_change]
+
+    def key(self, row: int) -> tuple:
+        """(race, horse) page key of a row"""
+        return race_names.names[self.store.race_ids[row]], horse_names.names[self.store.horse_ids[row]]
+
+    def _slices(self, filters: QueryFilters) -> list:
+        """(size, rows) per index the filters can use; rows are built only when chosen"""
+        slices = []
+        if filters.race is not None:
+            rows = self.by_race.get(filters.race_label) or self.by_race_id.get(filters.race, [])
+            slices.append((len(rows), lambda rows=rows: rows))
+        if filters.track is not None:
+            rows = self.by_track.get(filters.track, [])
+            slices.append((len(rows), lambda rows=rows: rows))
+        if filters.min_odds is not None or filters.max_odds is not None:
+            low = 0 if filters.min_odds is None else bisect_left(self.price_values, filters.min_odds)
+            high = len(self.price_values) if filters.max_odds is None else bisect_right(self.price_values, filters.max_odds)
+            slices.append((max(high - low, 0), lambda: self.by_price[low:high]))
+        if filters.updated_since is not None:
+            start = bisect_right(self.change_values, filters.updated_since)
+            slices.append((len(self.change_values) - start, lambda: self.by_change[start:]))
+        return slices
+
+    def matches(self, row: int, filters: QueryFilters) -> bool:
+        store = self.store
+        race_id, _, track_key = self.races[store.race_ids[row]]
+        if filters.race is not None:
+            if race_names.names[store.race_ids[row]].lower() != filters.race_label and race_id != filters.race:
+                return False
+        if filters.track is not None and track_key != filters.track:
+            return False
+        if filters.min_odds is not None and store.prices[row] < filters.min_odds:
+            return False
+        if filters.max_odds is not None and store.prices[row] > filters.max_odds:
+            return False
+        if filters.updated_since is not None and store.changed_at[row] <= filters.updated_since:
+            return False
+        return True
+
+    def select(self, filters: QueryFilters, after=None, limit: int = 0) -> list:
+        """Up to `limit` matching rows in page order, after the (race, horse) key given"""
+        start = 0 if after is None else bisect_right(self.rows, after, key=self.key)
+        slices = self._slices(filters)
+        if not slices:
+            return self.rows[start:start + limit]
+
+        size, build = min(slices, key=lambda entry: entry[0])
+        if size == 0:
+            return []
+        rank = self.rank
+        candidates = sorted(build(), key=rank.__getitem__)
+        first = bisect_left(candidates, start, key=rank.__getitem__)
+
+        selected = []
+        for row in candidates[first:]:
+            if self.matches(row, filters):
+                selected.append(row)
+                if len(selected) == limit:
+                    break
+        return selected
+
+    def project(self, row: int, fields) -> dict:
+        return {field: FIELD_VALUES[field](self, row) for field in fields}
+
+# How each projectable field is read from an indexed row
+FIELD_VALUES = {
+    "horse": lambda index, row: horse_names.names[index.store.horse_ids[row]],
+    "race": lambda index, row: race_names.names[index.store.race_ids[row]],
+    "odds": lambda index, row: index.store.prices[row],
+    "bookmaker": lambda index, row: index.store.bookmaker,
+    "track": lambda index, row: index.races[index.store.race_ids[row]][1],
+    "race_id": lambda index, row: index.races[index.store.race_ids[row]][0],
+    "changed_at": lambda index, row: datetime.fromtimestamp(index.store.changed_at[row], timezone.utc).isoformat()
+}
+
+def build_indexes(stores: dict, race_meta) -> dict:
+    """Fresh indexes for every bookmaker; race_meta(bookmaker, race) -> (race id, track)"""
+    return {bookmaker: BookmakerIndex(store, race_meta) for bookmaker, store in stores.items()}
+
+def encode_cursor(bookmaker: str, race: str, horse: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([bookmaker, race, horse]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """(bookmaker, race, horse) from a cursor; ValueError when it is not one of ours"""
+    try:
+        bookmaker, race, horse = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return str(bookmaker), str(race), str(horse)
+
+def run_query(indexes: dict, bookmakers, filters: QueryFilters, fields, limit: int, cursor=None) -> tuple:
+    """(projected runners, next cursor or None) for one page of a query"""
+    after = decode_cursor(cursor) if cursor else None
+    order = list(indexes)
+    if after is not None and after[0] not in indexes:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+    page = []
+    for bookmaker in order:
+        if bookmakers is not None and bookmaker not in bookmakers:
+            continue
+        if after is not None and order.index(bookmaker) < order.index(after[0]):
+            continue
+        index = indexes[bookmaker]
+        key = after[1:] if after is not None and after[0] == bookmaker else None
+        page += [(index, row) for row in index.select(filters, key, limit + 1 - len(page))]
+        if len(page) > limit:
+            break
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        index, row = page[-1]
+        next_cursor = encode_cursor(index.store.bookmaker, *index.key(row))
+    return [index.project(row, fields) for index, row in page], next_cursor
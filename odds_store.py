@@ -0,0 +1,256 @@
+"""
+Compact in-memory odds storage for the Fast Odds API
+
+Horse and race names are interned once to integer ids, and every bookmaker
+keeps its runners in array-backed columns that are updated in place each
+cycle. Views rebuild the existing JSON shapes on demand.
+"""
+
+import bisect
+import json
+import math
+import re
+import sys
+from array import array
+from functools import lru_cache
+
+class NameTable:
+    """Interns names to small integer ids"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def id_for(self, name: str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            name = sys.intern(name)
+            self.ids[name] = name_id
+            self.names.append(name)
+        return name_id
+
+    def __len__(self):
+        return len(self.names)
+
+# Shared across bookmakers so the same horse has the same id everywhere
+horse_names = NameTable()
+race_names = NameTable()
+
+@lru_cache(maxsize=65536)
+def fold_name(name: str) -> str:
+    """Case- and punctuation-folded horse name used for lookups"""
+    return re.sub(r"[\W_]+", "", name.lower())
+
+def name_trigrams(folded: str) -> set:
+    """Distinct 3-character substrings of a folded name"""
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+def encode_string(value: str) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+class OddsStore:
+    """Columnar odds for one bookmaker: integer runner ids and array-backed prices"""
+
+    def __init__(self, bookmaker: str):
+        self.bookmaker = bookmaker
+        self.slots = {}               # race_id << 32 | horse_id -> row
+        self.horse_rows = {}          # horse_id -> rows currently holding that horse
+        self.race_ids = array("i")
+        self.horse_ids = array("i")
+        self.prices = array("d")
+        self.changed_at = array("d")  # unix time of the last price change
+        self.fragments = []           # pre-encoded JSON object per row
+        self.order = array("i")       # live rows in upstream order
+        self.free_rows = []
+        self.suffix = b',"bookmaker":' + encode_string(bookmaker) + b"}"
+
+    def __len__(self):
+        return len(self.order)
+
+    def _encode_row(self, row: int) -> bytes:
+        return (
+            b'{"horse":' + encode_string(horse_names.names[self.horse_ids[row]])
+            + b',"race":' + encode_string(race_names.names[self.race_ids[row]])
+            + b',"odds":' + repr(self.prices[row]).encode() + self.suffix
+        )
+
+    def _allocate(self, race_id: int, horse_id: int, odds: float, now: float) -> int:
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.race_ids[row] = race_id
+            self.horse_ids[row] = horse_id
+            self.prices[row] = odds
+            self.changed_at[row] = now
+        else:
+            row = len(self.prices)
+            self.race_ids.append(race_id)
+            self.horse_ids.append(horse_id)
+            self.prices.append(odds)
+            self.changed_at.append(now)
+            self.fragments.append(None)
+        self.fragments[row] = self._encode_row(row)
+        self.horse_rows.setdefault(horse_id, []).append(row)
+        return row
+
+    def _release(self, row: int):
+        horse_id = self.horse_ids[row]
+        del self.slots[self.race_ids[row] << 32 | horse_id]
+        rows = self.horse_rows[horse_id]
+        rows.remove(row)
+        if not rows:
+            del self.horse_rows[horse_id]
+        self.fragments[row] = None
+        self.free_rows.append(row)
+
+    def _change(self, seq: int, kind: str, row: int, odds, previous) -> dict:
+        return {
+            "seq": seq,
+            "type": kind,
+            "bookmaker": self.bookmaker,
+            "race": race_names.names[self.race_ids[row]],
+            "horse": horse_names.names[self.horse_ids[row]],
+            "odds": odds,
+            "previous_odds": previous
+        }
+
+    def update(self, runners, seq: int, now: float) -> list:
+        """Apply a snapshot of (race, horse, odds) in place and return the changes"""
+        previous_order = self.order
+        seen = bytearray(len(self.prices))
+        live_races = set()
+        order = array("i")
+        changes = []
+
+        for race, horse, odds in runners:
+            if not math.isfinite(odds):
+                continue
+            race_id = race_names.id_for(race)
+            horse_id = horse_names.id_for(horse)
+            row = self.slots.get(race_id << 32 | horse_id)
+
+            if row is None:
+                row = self._allocate(race_id, horse_id, odds, now)
+                self.slots[race_id << 32 | horse_id] = row
+                if row == len(seen):
+                    seen.append(0)
+                changes.append(self._change(seq, "added", row, odds, None))
+            elif seen[row]:
+                continue  # first entry wins, 1 per horse per race
+            elif self.prices[row] != odds:
+                changes.append(self._change(seq, "moved", row, odds, self.prices[row]))
+                self.prices[row] = odds
+                self.changed_at[row] = now
+                self.fragments[row] = self._encode_row(row)
+
+            seen[row] = 1
+            live_races.add(race_id)
+            order.append(row)
+
+        # A runner missing from a race that is still on the card has been withdrawn
+        for row in previous_order:
+            if seen[row]:
+                continue
+            kind = "non_runner" if self.race_ids[row] in live_races else "removed"
+            changes.append(self._change(seq, kind, row, None, self.prices[row]))
+            self._release(row)
+
+        self.order = order
+        return changes
+
+    def runner(self, row: int) -> dict:
+        """The JSON shape of one runner"""
+        return {
+            "horse": horse_names.names[self.horse_ids[row]],
+            "race": race_names.names[self.race_ids[row]],
+            "odds": self.prices[row],
+            "bookmaker": self.bookmaker
+        }
+
+    def runners(self) -> list:
+        """The JSON shape of every live runner, in upstream order"""
+        return [self.runner(row) for row in self.order]
+
+    def encoded_runners(self) -> bytes:
+        """The JSON array of live runners, joined from per-row fragments"""
+        fragments = self.fragments
+        return b"[" + b",".join([fragments[row] for row in self.order]) + b"]"
+
+class HorseIndex:
+    """Folded-name index over live horse ids for exact, prefix and substring lookups"""
+
+    def __init__(self):
+        self.horse_ids = {}     # folded name -> live horse ids with that folded form
+        self.trigrams = {}      # trigram -> folded names containing it
+        self.sorted_names = []  # folded names in order, for prefix search
+        self.live = set()
+
+    def rebuild(self, horse_ids):
+        """Patch the index for horse ids that joined or left the card"""
+        current = set(horse_ids)
+        added = current - self.live
+        removed = self.live - current
+        names_changed = False
+
+        for horse_id in removed:
+            name = fold_name(horse_names.names[horse_id])
+            ids = self.horse_ids[name]
+            ids.discard(horse_id)
+            if ids:
+                continue
+            del self.horse_ids[name]
+            names_changed = True
+            for gram in name_trigrams(name):
+                postings = self.trigrams.get(gram)
+                if postings is not None:
+                    postings.discard(name)
+                    if not postings:
+                        del self.trigrams[gram]
+
+        for horse_id in added:
+            name = fold_name(horse_names.names[horse_id])
+            ids = self.horse_ids.get(name)
+            if ids:
+                ids.add(horse_id)
+                continue
+            self.horse_ids[name] = {horse_id}
+            names_changed = True
+            for gram in name_trigrams(name):
+                self.trigrams.setdefault(gram, set()).add(name)
+
+        if names_changed:
+            self.sorted_names = sorted(self.horse_ids)
+        self.live = current
+
+    def prefix(self, folded: str) -> list:
+        """Folded names starting with the query"""
+        names = []
+        start = bisect.bisect_left(self.sorted_names, folded)
+        for name in self.sorted_names[start:]:
+            if not name.startswith(folded):
+                break
+            names.append(name)
+        return names
+
+    def substring(self, folded: str) -> list:
+        """Folded names containing the query, narrowed by trigram postings"""
+        if len(folded) < 3:
+            candidates = self.sorted_names
+        else:
+            postings = sorted((self.trigrams.get(gram, set()) for gram in name_trigrams(folded)), key=len)
+            candidates = set.intersection(*postings) if postings[0] else set()
+        return sorted(name for name in candidates if folded in name)
+
+    def search(self, query: str, match: str = "substring") -> list:
+        """Matching folded names: exact first, then prefix, then substring"""
+        folded = fold_name(query)
+        if not folded:
+            return []
+
+        names = [folded] if folded in self.horse_ids else []
+        if match in ("prefix", "substring"):
+            names += [name for name in self.prefix(folded) if name != folded]
+        if match == "substring":
+            seen = set(names)
+            names += [name for name in self.substring(folded) if name not in seen]
+        return names
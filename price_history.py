@@ -0,0 +1,225 @@
+"""
+Per-runner price history for the Fast Odds API
+
+Every price point is appended to a fixed-size ring per runner holding its
+latest points, and written through to an append-only file for the day, which
+is read back through a memory map for anything older. Without a directory
+the history is kept in the rings only. Workers open the poller's directory
+read-only and answer every query from its day files.
+"""
+
+import json
+import mmap
+import os
+from array import array
+from datetime import datetime, timezone
+
+from odds_store import fold_name
+
+class PriceRing:
+    """Fixed-capacity ring of (timestamp, price) points
+
+    The arrays grow with each point until they reach capacity, so runners
+    that barely move cost a few doubles rather than a full ring.
+    """
+
+    __slots__ = ("times", "prices", "start", "capacity")
+
+    def __init__(self, capacity: int):
+        self.times = array("d")
+        self.prices = array("d")
+        self.start = 0
+        self.capacity = capacity
+
+    def append(self, timestamp: float, price: float):
+        """Add a point, returning the evicted (timestamp, price) when full"""
+        if len(self.times) < self.capacity:
+            self.times.append(timestamp)
+            self.prices.append(price)
+            return None
+        evicted = (self.times[self.start], self.prices[self.start])
+        self.times[self.start] = timestamp
+        self.prices[self.start] = price
+        self.start = (self.start + 1) % self.capacity
+        return evicted
+
+    def points(self) -> list:
+        count = len(self.times)
+        slots = ((self.start + i) % count for i in range(count))
+        return [(self.times[slot], self.prices[slot]) for slot in slots]
+
+class PriceHistory:
+    """Ring-buffered price history backed by a memory-mapped daily file"""
+
+    RECORD = 24  # key id, timestamp and price as three doubles
+
+    def __init__(self, directory: str | None, ring_size: int = 128, read_only: bool = False):
+        self.directory = directory
+        self.ring_size = ring_size
+        self.read_only = read_only  # follows another process's day files, record() is a no-op
+        self.day = None
+        self.keys = {}          # (bookmaker, race, horse) -> key id
+        self.key_names = []     # key id -> (bookmaker, race, horse)
+        self.by_name = {}       # folded horse name -> key ids
+        self.rings = {}         # key id -> PriceRing
+        self.written = {}       # key id -> record numbers in the day file
+        self.records = 0
+        self.keys_offset = 0    # bytes of the keys file already loaded
+        self.data_file = None
+        self.keys_file = None
+        self.mapped = None
+
+    def _paths(self, day: str):
+        base = os.path.join(self.directory, day)
+        return base + ".bin", base + ".keys"
+
+    def _open_day(self, day: str):
+        """Switch to the files for a UTC day, reloading anything already written"""
+        self.close()
+        self.day = day
+        self.keys, self.key_names, self.by_name = {}, [], {}
+        self.rings, self.written = {}, {}
+        self.records = self.keys_offset = 0
+        if self.directory is None:
+            return
+
+        data_path, keys_path = self._paths(day)
+        if self.read_only:
+            if os.path.exists(data_path) and os.path.exists(keys_path):
+                self.data_file = open(data_path, "rb")
+                self.keys_file = open(keys_path, "rb")
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Drop any partial record left by a crash mid-write
+        if os.path.exists(data_path):
+            size = os.path.getsize(data_path)
+            if size % self.RECORD:
+                with open(data_path, "r+b") as f:
+                    f.truncate(size - size % self.RECORD)
+
+        if os.path.exists(keys_path):
+            with open(keys_path, "rb") as f:
+                self._load_keys(f)
+        self.data_file = open(data_path, "a+b")
+        self.keys_file = open(keys_path, "a", encoding="utf-8")
+        self._load_records()
+
+    def _load_keys(self, f):
+        """Register the complete key lines written since the last load"""
+        f.seek(self.keys_offset)
+        data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            self._register(tuple(json.loads(line)))
+        self.keys_offset += len(complete)
+
+    def _load_records(self):
+        """Index the records written since the last load, up to the first with a key not loaded yet"""
+        available = os.fstat(self.data_file.fileno()).st_size // self.RECORD
+        if available <= self.records:
+            return
+        first = self.records
+        self.records = available
+        values = self._view()
+        for record in range(first, available):
+            key_id = int(values[record * 3])
+            if key_id >= len(self.key_names):
+                self.records = record
+                break
+            self.written.setdefault(key_id, array("I")).append(record)
+        values.release()
+
+    def _register(self, key: tuple) -> int:
+        key_id = len(self.key_names)
+        self.keys[key] = key_id
+        self.key_names.append(key)
+        self.by_name.setdefault(fold_name(key[2]), []).append(key_id)
+        return key_id
+
+    def _key_id(self, bookmaker: str, race: str, horse: str) -> int:
+        key = (bookmaker, race, horse)
+        key_id = self.keys.get(key)
+        if key_id is None:
+            key_id = self._register(key)
+            if self.keys_file is not None:
+                self.keys_file.write(json.dumps(key, ensure_ascii=False) + "\n")
+        return key_id
+
+    def _view(self):
+        """A float view over the mapped day file, or None while it is empty"""
+        if self.records == 0:
+            return None
+        if self.mapped is None or len(self.mapped) < self.records * self.RECORD:
+            if self.mapped is not None:
+                self.mapped.close()
+            self.data_file.flush()
+            self.mapped = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.mapped).cast("d")
+
+    def record(self, bookmaker: str, race: str, horse: str, timestamp: float, price: float):
+        """Append a price point to the runner's ring and the day file"""
+        if self.read_only:
+            return
+        day = datetime.fromtimestamp(timestamp, timezone.utc).date().isoformat()
+        if day != self.day:
+            self._open_day(day)
+
+        key_id = self._key_id(bookmaker, race, horse)
+        ring = self.rings.get(key_id)
+        if ring is None:
+            ring = self.rings[key_id] = PriceRing(self.ring_size)
+        ring.append(timestamp, price)
+        if self.data_file is not None:
+            self.data_file.write(array("d", [key_id, timestamp, price]).tobytes())
+            self.written.setdefault(key_id, array("I")).append(self.records)
+            self.records += 1
+
+    def flush(self):
+        """Make the cycle's points visible to readers: keys first, so no record outruns its key"""
+        if self.data_file is not None and not self.read_only:
+            self.keys_file.flush()
+            self.data_file.flush()
+
+    def refresh(self):
+        """Read-only: catch up with whatever the writer has flushed, following it across days"""
+        day = datetime.now(timezone.utc).date().isoformat()
+        if day != self.day or self.data_file is None:
+            self._open_day(day)
+        if self.data_file is not None:
+            self._load_keys(self.keys_file)
+            self._load_records()
+
+    def points(self, key_id: int) -> list:
+        """Every (timestamp, price) point for a runner, oldest first"""
+        ring = self.rings.get(key_id)
+        recent = ring.points() if ring is not None else []
+        records = self.written.get(key_id)
+        if not records:
+            return recent
+        # The ring repeats the newest records; read only the older ones from the file
+        older = records[:len(records) - len(recent)]
+        values = self._view()
+        points = [(values[record * 3 + 1], values[record * 3 + 2]) for record in older]
+        values.release()
+        return points + recent
+
+    def series(self, horse: str) -> list:
+        """(bookmaker, race, horse, points) for every runner with this folded name"""
+        if self.read_only and self.directory is not None:
+            self.refresh()
+        return [
+            (*self.key_names[key_id], self.points(key_id))
+            for key_id in self.by_name.get(fold_name(horse), ())
+        ]
+
+    def close(self):
+        """Close the day files; every point is already in them"""
+        self.rings = {}
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        for f in (self.data_file, self.keys_file):
+            if f is not None:
+                f.close()
+        self.data_file = self.keys_file = None
@@ -0,0 +1,102 @@
+"""
+Shared odds snapshot for the Fast Odds API
+
+In split mode one poller process writes each cycle's snapshot - the
+pre-rendered response bodies plus the runner state behind the dynamic
+endpoints - to a single file, normally on /dev/shm. HTTP workers map it
+read-only and serve the bodies straight out of the mapping, re-mapping only
+when a newer version has been published.
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b"FODDSNAP"
+HEADER = struct.Struct("<8sQI")  # magic, version, index length
+ENCODINGS = ("identity", "gzip", "br")
+
+def default_snapshot_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "fast_odds.snapshot")
+
+def write_snapshot(path: str, version: int, bodies: dict, state: bytes):
+    """Publish a snapshot: write a sibling file, then rename it over the old one"""
+    blobs = []
+    offset = 0
+
+    def place(blob: bytes) -> list:
+        nonlocal offset
+        span = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+        return span
+
+    index = {
+        "bodies": {
+            key: {"etag": cached["etag"], **{encoding: place(cached[encoding]) for encoding in ENCODINGS}}
+            for key, cached in bodies.items()
+        },
+        "state": place(state)
+    }
+    encoded_index = json.dumps(index, separators=(",", ":")).encode()
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, len(encoded_index)))
+        f.write(encoded_index)
+        f.writelines(blobs)
+    os.replace(temp_path, path)
+
+class SnapshotReader:
+    """Maps the newest published snapshot, once per version"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file_id = None
+        self.version = None
+
+    def poll(self):
+        """(version, bodies, state) when a new snapshot is available, else None
+
+        Bodies are memoryviews into the mapping. Old mappings are never closed
+        explicitly: each one is released once the last view into it is gone,
+        so responses still being sent from a previous version stay valid.
+        """
+        try:
+            if self._file_id(os.stat(self.path)) == self.file_id:
+                return None
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+
+        with f:
+            file_id = self._file_id(os.fstat(f.fileno()))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an odds snapshot")
+        self.file_id = file_id
+
+        start = HEADER.size + index_length
+        index = json.loads(mapped[HEADER.size:start])
+        view = memoryview(mapped)[start:]
+        bodies = {
+            key: {
+                "etag": entry["etag"],
+                **{encoding: view[entry[encoding][0]:sum(entry[encoding])] for encoding in ENCODINGS}
+            }
+            for key, entry in index["bodies"].items()
+        }
+        state_offset, state_length = index["state"]
+        state = json.loads(view[state_offset:state_offset + state_length].tobytes())
+
+        self.version = version
+        return version, bodies, state
+
+    @staticmethod
+    def _file_id(stat) -> tuple:
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,111 @@
+"""
+Warm-start snapshots for the Fast Odds API
+
+After each successful cycle the live runners are written to one compact
+binary file: a small JSON header, the race and horse names used, then four
+packed columns per bookmaker (race index, horse index, price, changed at).
+On boot the file is read back in milliseconds so the API can serve the last
+known odds, marked stale, while the first live refresh runs.
+"""
+
+import json
+import os
+import struct
+from array import array
+
+from odds_store import horse_names, race_names
+
+MAGIC = b"FOWARM01"
+HEADER = struct.Struct("<8sI")  # magic, meta length
+LENGTH = struct.Struct("<I")
+
+def _names_block(names: list) -> bytes:
+    blob = "\0".join(names).encode("utf-8")
+    return LENGTH.pack(len(blob)) + blob
+
+def snapshot_columns(stores: dict) -> dict:
+    """Copy the stores' columns so a snapshot can be written off the event loop
+
+    Array slices are plain memory copies; names are append-only, so the ids
+    stay valid without copying the name tables.
+    """
+    return {
+        bookmaker: (store.order[:], store.race_ids[:], store.horse_ids[:], store.prices[:], store.changed_at[:])
+        for bookmaker, store in stores.items()
+    }
+
+def write_warm_start(path: str, snapshot: dict, meta: dict):
+    """Atomically replace the snapshot file with a snapshot_columns() copy"""
+    race_index, horse_index = {}, {}
+    columns = []
+    for order, race_ids, horse_ids, prices, changed_at in snapshot.values():
+        columns.append((
+            array("I", [race_index.setdefault(race_ids[row], len(race_index)) for row in order]),
+            array("I", [horse_index.setdefault(horse_ids[row], len(horse_index)) for row in order]),
+            array("d", [prices[row] for row in order]),
+            array("d", [changed_at[row] for row in order]),
+        ))
+
+    meta = {**meta, "bookmakers": [[bookmaker, len(copied[0])] for bookmaker, copied in snapshot.items()]}
+    encoded_meta = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(encoded_meta)))
+        f.write(encoded_meta)
+        f.write(_names_block([race_names.names[race_id] for race_id in race_index]))
+        f.write(_names_block([horse_names.names[horse_id] for horse_id in horse_index]))
+        for column_set in columns:
+            for column in column_set:
+                column.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def read_warm_start(path: str):
+    """(meta, {bookmaker: (runners, changed_at)}) from a snapshot file
+
+    Raises FileNotFoundError when there is none and ValueError when it is
+    not a complete snapshot.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    try:
+        magic, meta_length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a warm-start snapshot")
+        offset = HEADER.size
+        meta = json.loads(data[offset:offset + meta_length])
+        offset += meta_length
+
+        name_lists = []
+        for _ in range(2):
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            blob = data[offset:offset + length].decode("utf-8")
+            name_lists.append(blob.split("\0") if blob else [])
+            offset += length
+        races, horses = name_lists
+
+        bookmakers = {}
+        for bookmaker, count in meta["bookmakers"]:
+            race_column, horse_column = array("I"), array("I")
+            prices, changed_at = array("d"), array("d")
+            for column in (race_column, horse_column, prices, changed_at):
+                size = count * column.itemsize
+                column.frombytes(data[offset:offset + size])
+                if len(column) != count:
+                    raise ValueError(f"{path} is truncated")
+                offset += size
+            runners = [
+                (races[race], horses[horse], price)
+                for race, horse, price in zip(race_column, horse_column, prices)
+            ]
+            bookmakers[bookmaker] = (runners, changed_at)
+    except (struct.error, KeyError, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"{path} is truncated or corrupt: {e!r}") from e
+
+    if offset != len(data):
+        raise ValueError(f"{path} has {len(data) - offset} unexpected trailing bytes")
+    return meta, bookmakers